@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.mock_server
+~~~~~~~~~~~~~~~~~~~~~~
+
+Local stand-in for the Newgistics Fulfillments and Web APIs, serving realistic XML bodies
+of a configurable size after a configurable latency.
+
+Usage::
+  $ python -m benchmarks.mock_server --records 5000 --latency 0.05 --port 8080
+"""
+
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+
+_ORDER_ID = re.compile(rb"<Order[^>]*?\sid=\"([^\"]*)\"")
+_RETURN_ID = re.compile(rb"<Return[^>]*?\s(?:id|orderID)=\"([^\"]*)\"")
+
+
+def _items(index: int, items: int) -> str:
+    return "".join(
+        "<Item><SKU>SKU-{sku:05d}</SKU><Qty>{qty}</Qty>"
+        "<Description>{description}</Description></Item>".format(
+            sku=(index * 7 + item) % 10000,
+            qty=1 + (index + item) % 5,
+            description=escape("Widget & co, size {size}".format(size=item % 4)),
+        )
+        for item in range(items)
+    )
+
+
+def shipments_xml(records: int, items: int = 3) -> bytes:
+    """
+    :return: shipments.aspx body with records <Shipment> elements
+    """
+    shipments = (
+        '<Shipment id="{index}" OrderID="ORD-{index:08d}">'
+        "<ClientName>Acme</ClientName>"
+        '<Warehouse id="3">Memphis</Warehouse>'
+        "<ShipmentStatus>SHIPPED</ShipmentStatus>"
+        "<ShipMethod>UPS Ground</ShipMethod>"
+        "<ShipDate>2019-04-{day:02d}T10:15:00</ShipDate>"
+        "<Tracking>1Z999AA1{index:010d}</Tracking>"
+        "<CustomerInfo><FirstName>John</FirstName><LastName>Barron</LastName>"
+        "<Company /><Address1>32142 Waverton Lane</Address1><Address2 />"
+        "<City>Huntersville</City><State>NC</State><Zip>28078</Zip>"
+        "<Country>US</Country><Email>john{index}@example.com</Email>"
+        "<Phone>5122256000</Phone><IsResidential>true</IsResidential></CustomerInfo>"
+        "<Items>{items}</Items>"
+        "</Shipment>".format(
+            index=index, day=1 + index % 28, items=_items(index, items)
+        )
+        for index in range(records)
+    )
+    return ("<Shipments>" + "".join(shipments) + "</Shipments>").encode()
+
+
+def returns_xml(records: int, items: int = 2, tag: str = "Return") -> bytes:
+    """
+    :return: returns.aspx (or inbound_returns.aspx) body with records <tag> elements
+    """
+    returns = (
+        '<{tag} id="{index}" orderID="ORD-{index:08d}">'
+        "<RMA>RMA{index:08d}</RMA>"
+        "<Status>RECEIVED</Status>"
+        "<ReceivedTimestamp>2019-04-{day:02d}T08:00:00</ReceivedTimestamp>"
+        "<Comments>Customer changed mind</Comments>"
+        "<Items>{items}</Items>"
+        "</{tag}>".format(
+            tag=tag, index=index, day=1 + index % 28, items=_items(index, items)
+        )
+        for index in range(records)
+    )
+    return (
+        "<{tag}s>".format(tag=tag) + "".join(returns) + "</{tag}s>".format(tag=tag)
+    ).encode()
+
+
+def post_response_xml(ids, tag: str = "Order") -> bytes:
+    """
+    :return: Body acknowledging every posted id
+    """
+    nodes = "".join(
+        '<{tag} id="{id}" success="true" />'.format(tag=tag, id=escape(node_id))
+        for node_id in ids
+    )
+    return (
+        "<response><success>true</success><{tag}s>{nodes}</{tag}s></response>".format(
+            tag=tag, nodes=nodes
+        )
+    ).encode()
+
+
+LABEL_XML = (
+    b"<ShipmentResponse><TrackingNumber>9274899998887766554433</TrackingNumber>"
+    b"<LabelUrl>https://labels.example.com/9274899998887766554433.pdf</LabelUrl>"
+    b"<Success>true</Success></ShipmentResponse>"
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes: without TCP_NODELAY, Nagle and the client's
+    # delayed ACK hold every keep-alive response back by about 40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body: bytes, status: int = 200):
+        time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.lstrip("/").lower()
+        body = self.server.bodies.get(path)
+        if body is None:
+            return self._reply(b"<error>Not Found</error>", status=404)
+        self._reply(body)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path.lstrip("/").lower()
+        payload = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if path == "post_shipments.aspx":
+            ids = [match.decode() for match in _ORDER_ID.findall(payload)]
+            return self._reply(post_response_xml(ids, tag="Order"))
+        if path == "post_inbound_returns.aspx":
+            ids = [match.decode() for match in _RETURN_ID.findall(payload)]
+            return self._reply(post_response_xml(ids, tag="Return"))
+        if path == "webapi/shipment":
+            return self._reply(LABEL_XML)
+        self._reply(b"<error>Not Found</error>", status=404)
+
+
+class MockNewgisticsServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server answering like Newgistics. Point a client at it with
+    client.production_url = server.url (or staging_url).
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        records: int = 100,
+        items: int = 3,
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        :param records: Number of records in the GET responses
+        :param items: Number of items per record
+        :param latency: Seconds slept before every response
+        :param host: Interface to listen on
+        :param port: Port to listen on, 0 picks a free one
+        """
+        HTTPServer.__init__(self, (host, port), _Handler)
+        self.latency = latency
+        self.bodies = {
+            "shipments.aspx": shipments_xml(records, items),
+            "returns.aspx": returns_xml(records, items),
+            "inbound_returns.aspx": returns_xml(records, items, tag="InboundReturn"),
+        }
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return "http://{host}:{port}".format(host=host, port=port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1].strip())
+    parser.add_argument("--records", type=int, default=100)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    server = MockNewgisticsServer(
+        args.records, args.items, args.latency, host=args.host, port=args.port
+    )
+    print("Serving on {url}".format(url=server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.run
+~~~~~~~~~~~~~~
+
+Benchmarks the import time and the hot paths of the clients against the local mock server
+and prints the results as JSON: throughput, p50/p99 latency and peak traced memory of every
+scenario.
+
+Usage::
+  $ python -m benchmarks.run --records 2000 --output results.json
+  $ python -m benchmarks.run --compare results.json --threshold 0.25
+"""
+
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import requests
+import xmltodict
+
+from newgistics import NewgisticsFulfillment, NewgisticsWeb, serialize
+from newgistics.auth import FulfillmentAuth
+from newgistics.fulfillments import BaseClient
+from newgistics.transport import RecordingAdapter, ReplayAdapter
+
+from .mock_server import MockNewgisticsServer, shipments_xml
+
+SAMPLE_ORDER = {
+    "AllowDuplicate": False,
+    "CustomerInfo": {
+        "Address1": "32142 Waverton Lane",
+        "Address2": None,
+        "City": "Huntersville",
+        "Company": None,
+        "Country": "US",
+        "Email": "yestestmail@gmail.com",
+        "FirstName": "John",
+        "IsResidential": "true",
+        "LastName": "Barron",
+        "Phone": None,
+        "State": "NC",
+        "Zip": "28078",
+    },
+    "HoldForAllInventory": False,
+    "Items": {"Item": [{"Qty": 10, "SKU": "HLU"}, {"Qty": 2, "SKU": "BRX"}]},
+    "OrderDate": "04-12-2019",
+    "RequiresSignature": False,
+    "id": "4321",
+}
+
+SAMPLE_LABEL = {
+    "clientServiceFlag": "Standard",
+    "consumer": {"FirstName": "testname", "LastName": "tester"},
+    "deliveryMethod": "SelfService",
+    "dispositionRuleSetId": 99,
+    "labelCount": 1,
+    "merchantID": "NGST",
+    "returnId": "123456789A",
+}
+
+
+def _percentile(samples: list, percent: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(name: str, operation, repeat: int, units: int = 1) -> dict:
+    """
+    Runs operation repeat times for latencies, then once more under tracemalloc
+    :param name: Scenario name
+    :param operation: Callable doing one unit of work (or units of them)
+    :param repeat: Number of timed calls
+    :param units: Units of work done by one call, e.g. requests sent
+    :return: dict of results
+    """
+    samples = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        operation()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "name": name,
+        "repeat": repeat,
+        "units": units,
+        "throughput_per_s": round(repeat * units / elapsed, 3),
+        "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+        "peak_memory_bytes": peak,
+    }
+
+
+# Times one import statement in a fresh interpreter, printing seconds and peak memory
+# (traced only when asked to, tracing slows imports down a lot)
+_IMPORT_PROBE = """
+import sys, time, tracemalloc
+if sys.argv[1:] == ["trace"]:
+    tracemalloc.start()
+started = time.perf_counter()
+{statement}
+print(time.perf_counter() - started, tracemalloc.get_traced_memory()[1])
+"""
+
+
+def measure_import(name: str, statement: str, repeat: int) -> dict:
+    """
+    Cold import time of statement, each run in a new interpreter, then once more under
+    tracemalloc for the memory
+    :param name: Scenario name
+    :param statement: Import statement, e.g. from newgistics import NewgisticsWeb
+    :param repeat: Number of timed interpreters
+    :return: dict of results, like measure()
+    """
+
+    def probe(*args):
+        output = subprocess.check_output(
+            [sys.executable, "-c", _IMPORT_PROBE.format(statement=statement)]
+            + list(args)
+        )
+        seconds, peak = output.split()
+        return float(seconds), int(peak)
+
+    samples = [probe()[0] for _ in range(repeat)]
+    return {
+        "name": name,
+        "repeat": repeat,
+        "units": 1,
+        "throughput_per_s": round(len(samples) / sum(samples), 3),
+        "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+        "peak_memory_bytes": probe("trace")[1],
+    }
+
+
+def _response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    return response
+
+
+def run(args) -> list:
+    results = [
+        measure_import("import_package", "import newgistics", args.repeat),
+        measure_import(
+            "import_web_client", "from newgistics import NewgisticsWeb", args.repeat
+        ),
+        measure_import(
+            "import_fulfillment_client",
+            "from newgistics import NewgisticsFulfillment",
+            args.repeat,
+        ),
+    ]
+    body = shipments_xml(args.records, args.items)
+
+    results.append(
+        measure(
+            "process_and_parse",
+            lambda: BaseClient.process(_response(body)).dict,
+            args.repeat,
+        )
+    )
+
+    orders = {
+        "Orders": {
+            "Order": [
+                dict(copy.deepcopy(SAMPLE_ORDER), id=str(index))
+                for index in range(args.batch)
+            ]
+        }
+    }
+    results.append(
+        measure(
+            "serialize_orders",
+            lambda: serialize.orders(orders, api_key="BENCH"),
+            args.repeat,
+            units=args.batch,
+        )
+    )
+
+    def unparse_orders():
+        payload = copy.deepcopy(orders)
+        payload["Orders"]["@apiKey"] = "BENCH"
+        for order in payload["Orders"]["Order"]:
+            order["@id"] = order["id"]
+        return xmltodict.unparse(payload)
+
+    results.append(
+        measure(
+            "serialize_orders_xmltodict", unparse_orders, args.repeat, units=args.batch
+        )
+    )
+
+    ngf_client = NewgisticsFulfillment(api_key="BENCH")
+    results.append(
+        measure(
+            "prepare_request",
+            lambda: ngf_client.request_template.prepare(
+                "GET", "shipments.aspx", params={"id": "1"}
+            ),
+            args.repeat * 100,
+        )
+    )
+
+    def prepare_with_auth():
+        # What _make_request used to go through: a new auth object, the session
+        # preparing the request, the auth preparing the URL again, then the settings
+        session = ngf_client.session
+        prepared = session.prepare_request(
+            requests.Request(
+                "GET",
+                url=ngf_client.api_endpoint + "/shipments.aspx",
+                params={"id": "1"},
+                auth=FulfillmentAuth(api_key="BENCH"),
+            )
+        )
+        session.merge_environment_settings(prepared.url, {}, None, None, None)
+
+    results.append(
+        measure("prepare_request_session", prepare_with_auth, args.repeat * 100)
+    )
+    ngf_client.close()
+
+    with MockNewgisticsServer(args.records, args.items, args.latency) as server:
+        with NewgisticsFulfillment(
+            api_key="BENCH", pool_maxsize=args.workers
+        ) as ngf_client, NewgisticsWeb(api_key="BENCH") as ngw_client:
+            ngf_client.production_url = server.url
+            ngw_client.production_url = server.url
+            ids = [{"id": str(index)} for index in range(args.requests)]
+
+            results.append(
+                measure(
+                    "fetch_sync",
+                    lambda: [
+                        ngf_client.shipments.fetch(params=params) for params in ids
+                    ],
+                    max(1, args.repeat // 10),
+                    units=args.requests,
+                )
+            )
+            results.append(
+                measure(
+                    "fetch_concurrent",
+                    lambda: list(
+                        ngf_client.map_fetch("shipments", ids, workers=args.workers)
+                    ),
+                    max(1, args.repeat // 10),
+                    units=args.requests,
+                )
+            )
+            results.append(
+                measure(
+                    "fetch_and_parse",
+                    lambda: ngf_client.shipments.fetch().dict,
+                    args.repeat,
+                )
+            )
+            results.append(
+                measure(
+                    "iter_fetch_stream",
+                    lambda: sum(1 for _ in ngf_client.shipments.iter_fetch()),
+                    args.repeat,
+                )
+            )
+            results.append(
+                measure(
+                    "create_many",
+                    lambda: ngf_client.shipments.create_many(
+                        orders["Orders"]["Order"], batch_size=args.batch
+                    ),
+                    args.repeat,
+                    units=args.batch,
+                )
+            )
+            results.append(
+                measure(
+                    "label_create",
+                    lambda: ngw_client.labels.create(payload=SAMPLE_LABEL),
+                    args.repeat,
+                )
+            )
+
+        archive = os.path.join(tempfile.mkdtemp(), "traffic.ngrr")
+        recorder = RecordingAdapter(archive)
+        with NewgisticsFulfillment(api_key="BENCH", transport=recorder) as ngf_client:
+            ngf_client.production_url = server.url
+            for params in ids:
+                ngf_client.shipments.fetch(params=params)
+
+    # The client alone, the recorded responses being served from memory
+    with NewgisticsFulfillment(
+        api_key="BENCH", transport=ReplayAdapter(archive)
+    ) as ngf_client:
+        results.append(
+            measure(
+                "fetch_replay",
+                lambda: [ngf_client.shipments.fetch(params=params) for params in ids],
+                max(1, args.repeat // 10),
+                units=args.requests,
+            )
+        )
+    os.remove(archive)
+    os.rmdir(os.path.dirname(archive))
+    return results
+
+
+def compare(results: list, baseline_path: str, threshold: float) -> list:
+    """
+    :return: Messages for the scenarios whose p50 got slower than the baseline by more
+             than threshold (a ratio, 0.25 for 25%)
+    """
+    with open(baseline_path) as baseline_file:
+        baseline = {result["name"]: result for result in json.load(baseline_file)}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["name"])
+        if not previous or not previous["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / previous["p50_ms"] - 1
+        if ratio > threshold:
+            regressions.append(
+                "{name}: p50 {before}ms -> {after}ms (+{ratio:.0%})".format(
+                    name=result["name"],
+                    before=previous["p50_ms"],
+                    after=result["p50_ms"],
+                    ratio=ratio,
+                )
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Newgistics client benchmarks")
+    parser.add_argument(
+        "--records", type=int, default=1000, help="records per GET body"
+    )
+    parser.add_argument("--items", type=int, default=3, help="items per record")
+    parser.add_argument("--latency", type=float, default=0.0, help="server latency (s)")
+    parser.add_argument("--requests", type=int, default=100, help="fetches per run")
+    parser.add_argument("--workers", type=int, default=8, help="map_fetch threads")
+    parser.add_argument("--batch", type=int, default=100, help="orders per document")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
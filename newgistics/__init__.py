@@ -7,8 +7,73 @@ Newgistics Python Client (Unofficial)
 :copyright: (c) 2019 by Sameer Kumar.
 :license: Apache 2.0, see LICENSE for more details.
 https://newgistics.com/
- """
+"""
+
 __version__ = "0.2"
 
-from .fulfillments import Fulfillment as NewgisticsFulfillment
-from .web import NewgisticsREST as NewgisticsWeb
+import importlib
+import sys
+
+# {public name: (module, attribute)}. The clients are imported on first access (PEP 562),
+# so `import newgistics` is cheap and only the client in use loads requests and the rest
+_LAZY_ATTRIBUTES = {
+    "NewgisticsFulfillment": ("fulfillments", "Fulfillment"),
+    "NewgisticsWeb": ("web", "NewgisticsREST"),
+    "AsyncFulfillment": ("aio", "AsyncFulfillment"),
+    "AsyncWeb": ("aio", "AsyncWeb"),
+}
+
+# Submodules reachable as attributes, as they were when the clients were imported eagerly
+_SUBMODULES = frozenset(
+    (
+        "aio",
+        "auth",
+        "breaker",
+        "cache",
+        "cli",
+        "coalesce",
+        "exceptions",
+        "fulfillments",
+        "labels",
+        "metrics",
+        "models",
+        "outbox",
+        "pool",
+        "ratelimit",
+        "response",
+        "retry",
+        "serialize",
+        "streaming",
+        "sync",
+        "transport",
+        "web",
+    )
+)
+
+__all__ = ["NewgisticsFulfillment", "NewgisticsWeb", "AsyncFulfillment", "AsyncWeb"]
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(
+            "module {module!r} has no attribute {name!r}".format(
+                module=__name__, name=name
+            )
+        )
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    value = getattr(importlib.import_module("." + module_name, __name__), attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | _SUBMODULES)
+
+
+if sys.version_info < (3, 7):  # pragma: no cover
+    # No module __getattr__ before Python 3.7
+    from .fulfillments import Fulfillment as NewgisticsFulfillment
+    from .web import NewgisticsREST as NewgisticsWeb
+    from .aio import AsyncFulfillment, AsyncWeb
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.aio
+~~~~~~~~~~~~~~
+
+This module contains asyncio variants of the Newgistics Fulfillments and Web REST API clients.
+Requires aiohttp, install with `pip install newgistics[async]`.
+"""
+
+import asyncio
+import os
+from functools import partial
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .auth import FulfillmentAuth, RequestTemplate, WebAPIAuth
+from . import breaker, exceptions, fulfillments, ratelimit, retry, serialize, web
+from .response import ParsedResponse
+
+
+class AsyncClient(object):
+    """
+    Parent class for AsyncFulfillment and AsyncWeb.
+    Holds the aiohttp session (and its connection pool) and the concurrency limit.
+    """
+
+    staging_url = None
+    production_url = None
+    # Auth class the request templates are built from
+    auth_class = None
+
+    def __init__(
+        self,
+        api_key: str,
+        staging: bool = False,
+        session=None,
+        max_connections: int = 100,
+        max_concurrency: int = None,
+        timeout: float = None,
+        retry_policy: retry.RetryPolicy = None,
+        rate_limiter: ratelimit.RateLimiter = None,
+        circuit_breaker: breaker.CircuitBreaker = None,
+    ):
+        """
+        :param api_key: API Key provided by your Newgistics's account manager
+        :param staging: False if in production else True
+        :param session: aiohttp.ClientSession to share a connection pool between clients (Optional)
+        :param max_connections: Size of the connection pool, ignored when a session is given
+        :param max_concurrency: Maximum number of requests in flight for this client (Optional)
+        :param timeout: Total timeout of a request in seconds (Optional)
+        :param retry_policy: newgistics.retry.RetryPolicy, 3 attempts with backoff by default
+        :param rate_limiter: newgistics.ratelimit.RateLimiter, may be shared by clients (Optional)
+        :param circuit_breaker: newgistics.breaker.CircuitBreaker failing requests fast while
+                                an endpoint fails, may be shared by clients (Optional)
+        """
+
+        if aiohttp is None:
+            raise ImportError(
+                "aiohttp is required for the asyncio clients, "
+                "install it with `pip install newgistics[async]`"
+            )
+        if not api_key:
+            raise exceptions.IncorrectParameterError("Missing API Key")
+        self.staging = staging
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retry_policy = retry_policy or retry.RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self._session = session
+        self._owns_session = session is None
+        self._semaphore = None
+        self._request_template = None
+
+    @property
+    def api_endpoint(self) -> str:
+        if self.staging:
+            return self.staging_url
+        return self.production_url
+
+    @property
+    def request_template(self) -> RequestTemplate:
+        """
+        :return: newgistics.auth.RequestTemplate of the current api_endpoint and api_key
+        """
+        key = (self.api_endpoint, self.api_key)
+        if self._request_template is None or self._request_template[0] != key:
+            template = self.auth_class(api_key=self.api_key).template(self.api_endpoint)
+            self._request_template = (key, template)
+        return self._request_template[1]
+
+    @property
+    def session(self):
+        """
+        :return: aiohttp.ClientSession, created on first use inside the running event loop
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def send(
+        self,
+        prepared: requests.PreparedRequest,
+        idempotent: bool = None,
+        resource_endpoint: str = None,
+    ) -> requests.Response:
+        """
+        Sends a prepared request over aiohttp, retrying it as retry_policy allows
+        :param prepared: requests.PreparedRequest object, with auth already applied
+        :param idempotent: Whether the request may be retried, guessed from the method by default (Optional)
+        :param resource_endpoint: Endpoint the rate_limiter bucket is picked by (Optional)
+        :return: requests.Response object holding the downloaded body
+        """
+
+        policy = self.retry_policy
+        policy.count("requests")
+        if not policy.is_idempotent(prepared.method, idempotent):
+            return await self._send_limited(prepared, resource_endpoint)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._send_limited(prepared, resource_endpoint)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                if not policy.should_retry(attempt, error=err):
+                    raise
+                await asyncio.sleep(policy.backoff(attempt))
+                continue
+            if not policy.should_retry(attempt, response=response):
+                return response
+            await asyncio.sleep(policy.backoff(attempt, response))
+
+    async def _send_limited(
+        self, prepared: requests.PreparedRequest, resource_endpoint: str = None
+    ) -> requests.Response:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(self.api_key, resource_endpoint)
+        if self.circuit_breaker is None:
+            return await self._send_concurrent(prepared)
+
+        started = self.circuit_breaker.acquire(resource_endpoint)
+        try:
+            response = await self._send_concurrent(prepared)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+            self.circuit_breaker.release(resource_endpoint, started, error=err)
+            raise
+        except BaseException:
+            self.circuit_breaker.release(resource_endpoint, started)
+            raise
+        self.circuit_breaker.release(resource_endpoint, started, response=response)
+        return response
+
+    async def _send_concurrent(
+        self, prepared: requests.PreparedRequest
+    ) -> requests.Response:
+        if self.max_concurrency and self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore is not None:
+            async with self._semaphore:
+                return await self._send(prepared)
+        return await self._send(prepared)
+
+    async def _send(self, prepared: requests.PreparedRequest) -> requests.Response:
+        timeout = None
+        if self.timeout is not None:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with self.session.request(
+            prepared.method,
+            yarl.URL(prepared.url, encoded=True),
+            data=prepared.body,
+            headers=dict(prepared.headers),
+            timeout=timeout,
+        ) as resp:
+            response = requests.Response()
+            response.status_code = resp.status
+            response.reason = resp.reason
+            response.url = str(resp.url)
+            response.headers = CaseInsensitiveDict(resp.headers)
+            response.encoding = get_encoding_from_headers(response.headers)
+            response.request = prepared
+            response._content = await resp.read()
+            return response
+
+    async def close(self):
+        """
+        Closes the aiohttp session, unless it was passed in by the caller
+        """
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class AsyncFulfillment(AsyncClient):
+    """
+    asyncio client for Newgistics Fulfillments API
+
+    Usage::
+      >>> from newgistics import AsyncFulfillment
+      >>> async with AsyncFulfillment(api_key='API-KEY', max_concurrency=50) as ngf_client:
+      ...     response = await ngf_client.shipments.fetch(params={'id': '4231'})
+    """
+
+    staging_url = "https://apistaging.newgisticsfulfillment.com"
+    production_url = "https://api.newgisticsfulfillment.com"
+    auth_class = FulfillmentAuth
+
+    def __init__(self, api_key: str = os.environ.get("NG_FL_API_KEY"), **kwargs):
+        super(AsyncFulfillment, self).__init__(api_key, **kwargs)
+        self.returns = AsyncReturn(self)
+        self.inbound_returns = AsyncInboundReturn(self)
+        self.shipments = AsyncShipment(self)
+
+    def prepare(self, method_name: str, resource_endpoint: str, **kwargs):
+        """
+        Builds the request the way fulfillments.BaseClient._make_request does
+        :return: requests.PreparedRequest object
+        """
+        dict_payload = kwargs.get("dict_payload")
+        serializer = kwargs.get("serializer", serialize.unparse)
+        xml_payload = None
+        if dict_payload:
+            xml_payload = serializer(dict_payload)
+        return self.request_template.prepare(
+            method_name,
+            resource_endpoint,
+            params=kwargs.get("query_params"),
+            data=xml_payload,
+            headers=kwargs.get("headers"),
+        )
+
+    process = staticmethod(fulfillments.BaseClient.process)
+
+
+class AsyncWeb(AsyncClient):
+    """
+    asyncio client for Newgistics REST Web API
+
+    Usage::
+      >>> from newgistics import AsyncWeb
+      >>> async with AsyncWeb(api_key='API-KEY', max_concurrency=50) as ngweb_client:
+      ...     response = await ngweb_client.labels.create(payload={})
+    """
+
+    staging_url = "https://apiint.newgistics.com"
+    production_url = "https://api.newgistics.com"
+    auth_class = WebAPIAuth
+
+    def __init__(self, api_key: str = os.environ.get("NG_WEB_API_KEY"), **kwargs):
+        super(AsyncWeb, self).__init__(api_key, **kwargs)
+        self.labels = AsyncShipmentLabel(self)
+
+    def prepare(self, method_name: str, resource_endpoint: str, **kwargs):
+        """
+        Builds the request the way web.BaseClient._make_request does
+        :return: requests.PreparedRequest object
+        """
+        dict_payload = kwargs.get("dict_payload")
+        return self.request_template.prepare(
+            method_name,
+            resource_endpoint,
+            params=kwargs.get("query_params"),
+            data=None if dict_payload is None else web._dump_json(dict_payload),
+            headers=kwargs.get("headers"),
+        )
+
+    process = staticmethod(web.BaseClient.process)
+
+
+class AsyncBaseClient(object):
+    """
+    Parent class for all asyncio resources
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def _request(self, method_name: str, resource_endpoint: str, **kwargs):
+        """
+        Prepares, sends and processes a request exactly like the blocking clients do
+        :param method_name: HTTP Method Name. Example: GET POST
+        :param resource_endpoint: The resource after the base URL
+        :param dict_payload: HTTP Request Payload (Optional)
+        :param serializer: Turns dict_payload into XML, serialize.unparse by default (Optional)
+        :param query_params: HTTP Request Query Params (Optional)
+        :param headers: HTTP Request Headers (Optional)
+        :param idempotent: Whether the request may be retried, guessed from the method by default (Optional)
+        :return: newgistics.response.ParsedResponse object
+        """
+
+        prepared = self.client.prepare(method_name, resource_endpoint, **kwargs)
+        response = await self.client.send(
+            prepared,
+            idempotent=kwargs.get("idempotent"),
+            resource_endpoint=resource_endpoint,
+        )
+        return self.client.process(response)
+
+
+class AsyncInboundReturn(AsyncBaseClient):
+    """
+    asyncio counterpart of fulfillments.InboundReturn
+    """
+
+    async def fetch(self, params: dict = None) -> ParsedResponse:
+        return await self._request(
+            "GET", resource_endpoint="inbound_returns.aspx", query_params=params
+        )
+
+    async def create(self, payload: dict = None, params: dict = None) -> ParsedResponse:
+        return await self._request(
+            "POST",
+            resource_endpoint="post_inbound_returns.aspx",
+            query_params=params,
+            dict_payload=payload,
+            serializer=partial(serialize.returns, api_key=self.client.api_key),
+        )
+
+
+class AsyncReturn(AsyncBaseClient):
+    """
+    asyncio counterpart of fulfillments.Return
+    """
+
+    async def fetch(self, params: dict = None) -> ParsedResponse:
+        return await self._request(
+            "GET", resource_endpoint="returns.aspx", query_params=params
+        )
+
+
+class AsyncShipment(AsyncBaseClient):
+    """
+    asyncio counterpart of fulfillments.Shipment
+    """
+
+    async def fetch(self, params: dict = None) -> ParsedResponse:
+        return await self._request(
+            "GET", resource_endpoint="shipments.aspx", query_params=params
+        )
+
+    async def create(self, payload: dict = None, params: dict = None) -> ParsedResponse:
+        orders = fulfillments._orders_of(payload)
+        return await self._request(
+            "POST",
+            resource_endpoint="post_shipments.aspx",
+            query_params=params,
+            dict_payload=payload,
+            serializer=partial(serialize.orders, api_key=self.client.api_key),
+            idempotent=not any(
+                fulfillments._allows_duplicate(order) for order in orders
+            ),
+        )
+
+
+class AsyncShipmentLabel(AsyncBaseClient):
+    """
+    asyncio counterpart of web.ShipmentLabel
+    """
+
+    async def create(self, payload: dict = None, params: dict = None) -> ParsedResponse:
+        return await self._request(
+            "POST",
+            resource_endpoint="WebAPI/Shipment",
+            query_params=params,
+            dict_payload=payload,
+        )
@@ -4,10 +4,18 @@
 newgistics.auth
 ~~~~~~~~~~~~~~~
 
-Auth classes attaching HTTP Authentication & Content-Type to the given PreparedRequest object.
+Auth classes attaching HTTP Authentication & Content-Type to the given PreparedRequest object,
+and the request templates the clients build their requests from.
 """
 
+from urllib.parse import urlencode
+
 from requests import auth, PreparedRequest
+from requests.cookies import merge_cookies, RequestsCookieJar
+from requests.hooks import default_hooks
+from requests.models import RequestEncodingMixin
+from requests.sessions import merge_setting
+from requests.structures import CaseInsensitiveDict
 
 
 class WebAPIAuth(auth.AuthBase):
@@ -22,6 +30,16 @@ class WebAPIAuth(auth.AuthBase):
 
         return r
 
+    def template(self, base_url: str, session=None):
+        """
+        :return: RequestTemplate sending these headers with every request
+        """
+        return RequestTemplate(
+            base_url,
+            {"Content-Type": self.content_type, "x-API-Key": self.api_key},
+            session=session,
+        )
+
 
 class FulfillmentAuth(auth.AuthBase):
     def __init__(self, api_key: str, content_type="application/xml"):
@@ -35,3 +53,136 @@ class FulfillmentAuth(auth.AuthBase):
         r.prepare_url(r.url, dict(key=self.api_key))
 
         return r
+
+    def template(self, base_url: str, session=None):
+        """
+        :return: RequestTemplate sending the key query parameter with every request
+        """
+        return RequestTemplate(
+            base_url,
+            {"Content-Type": self.content_type},
+            query={"key": self.api_key},
+            session=session,
+        )
+
+
+class RequestTemplate(object):
+    """
+    What the requests of a client have in common, computed once: the normalized URL of
+    each endpoint, the auth query string, the headers (the session's and the auth ones)
+    and the proxy/TLS settings of the environment.
+    prepare() then only encodes the params and body of a call, instead of requests
+    preparing the whole request and an auth class parsing and encoding the URL again.
+    The session's headers, params and settings are read when the template is built,
+    the clients build a new one when their api_endpoint or api_key changes.
+    """
+
+    def __init__(
+        self, base_url: str, auth_headers: dict, query: dict = None, session=None
+    ):
+        """
+        :param base_url: API base URL, e.g. client.api_endpoint
+        :param auth_headers: Headers set on every request, over the caller's ones
+        :param query: Query parameters appended to every URL (Optional)
+        :param session: requests.Session the requests are sent with (Optional)
+        """
+        self.base_url = base_url
+        self.auth_headers = auth_headers
+        self.query = urlencode(query) if query else ""
+        self.session = session
+        headers = CaseInsensitiveDict(session.headers if session is not None else {})
+        headers.update(auth_headers)
+        self.headers = headers
+        self.params = dict(session.params) if session is not None else {}
+        self.settings = {}
+        if session is not None:
+            self.settings = session.merge_environment_settings(
+                base_url, {}, None, None, None
+            )
+            del self.settings["stream"]
+        self._urls = {}
+
+    def url(self, resource_endpoint: str, params: dict = None) -> str:
+        """
+        :return: URL of resource_endpoint with the query params, then the auth query
+        """
+        base = self._urls.get(resource_endpoint)
+        if base is None:
+            prepared = PreparedRequest()
+            prepared.prepare_url(
+                "{base_url}/{resource_endpoint}".format(
+                    base_url=self.base_url, resource_endpoint=resource_endpoint
+                ),
+                None,
+            )
+            base = self._urls[resource_endpoint] = prepared.url
+        if self.params:
+            params = merge_setting(params, self.params)
+        query = RequestEncodingMixin._encode_params(params) if params else ""
+        if self.query:
+            query = query + "&" + self.query if query else self.query
+        if not query:
+            return base
+        return base + ("&" if "?" in base else "?") + query
+
+    def prepare(
+        self,
+        method_name: str,
+        resource_endpoint: str,
+        params: dict = None,
+        data=None,
+        headers: dict = None,
+    ) -> PreparedRequest:
+        """
+        Builds a request the way requests.Session.request would with the auth class
+        :param method_name: HTTP Method Name. Example: GET POST
+        :param resource_endpoint: The resource after the base URL
+        :param params: HTTP Request Query Params (Optional)
+        :param data: Body, str (sent as UTF-8) or bytes (Optional)
+        :param headers: HTTP Request Headers, under the auth ones (Optional)
+        :return: requests.PreparedRequest object
+        """
+        prepared = PreparedRequest()
+        prepared.method = method_name.upper()
+        prepared.url = self.url(resource_endpoint, params)
+        if headers:
+            merged = self.headers.copy()
+            merged.update(headers)
+            merged.update(self.auth_headers)
+            for name in [name for name, value in merged.items() if value is None]:
+                del merged[name]
+            prepared.headers = merged
+        else:
+            prepared.headers = self.headers.copy()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        prepared.body = data or None
+        if prepared.body is not None:
+            prepared.headers["Content-Length"] = str(len(prepared.body))
+        elif prepared.method not in ("GET", "HEAD"):
+            prepared.headers["Content-Length"] = "0"
+        prepared.hooks = default_hooks()
+        if self.session is None:
+            return prepared
+        for event, hooks in self.session.hooks.items():
+            prepared.hooks[event].extend(hooks)
+        if len(self.session.cookies):
+            prepared.prepare_cookies(
+                merge_cookies(RequestsCookieJar(), self.session.cookies)
+            )
+        else:
+            prepared._cookies = RequestsCookieJar()
+        return prepared
+
+    def send(self, prepared: PreparedRequest, timeout=None, stream: bool = False):
+        """
+        Sends a prepared request through the session
+        :return: requests.Response object
+        """
+        return self.session.send(
+            prepared,
+            timeout=timeout,
+            stream=stream,
+            allow_redirects=True,
+            **self.settings
+        )
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.breaker
+~~~~~~~~~~~~~~~~~~
+
+Per-endpoint circuit breaker and load shedding: requests fail fast while Newgistics is
+failing or slow instead of tying up the callers' threads until they time out.
+"""
+
+import threading
+import time
+from collections import deque
+
+import requests
+
+from . import exceptions
+from .retry import RETRY_STATUSES
+
+# States of a circuit
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _Circuit(object):
+    __slots__ = ("state", "outcomes", "opened_at", "trials", "successes", "in_flight")
+
+    def __init__(self, window: int):
+        self.state = CLOSED
+        # (failed, slow) of the last window calls
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = None
+        self.trials = 0
+        self.successes = 0
+        self.in_flight = 0
+
+
+class CircuitBreaker(object):
+    """
+    Keeps a circuit per endpoint. A closed circuit lets requests through and trips open
+    when, over its last window calls (at least min_calls), the share of failures reaches
+    failure_rate or the share of calls slower than slow_call_duration reaches
+    slow_call_rate. An open circuit fails requests with CircuitOpenError for open_duration
+    seconds, then turns half-open: up to trial_calls requests are let through, closing the
+    circuit if they all succeed and opening it again on the first failure or slow call.
+
+    Failures are connection errors, timeouts and the statuses responses, 429 and 5xx by
+    default. Each attempt of a retried request counts.
+
+    With max_in_flight, requests beyond that many in flight on an endpoint fail at once
+    with LoadShedError instead of queueing.
+
+    Usage::
+      >>> def alert(endpoint, old_state, new_state):
+      ...     logger.warning('Newgistics %s circuit %s -> %s', endpoint, old_state, new_state)
+      >>> breaker = CircuitBreaker(slow_call_duration=5, max_in_flight=32, listeners=[alert])
+      >>> ngf_client = NewgisticsFulfillment(api_key='API-KEY', circuit_breaker=breaker)
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        slow_call_rate: float = 0.8,
+        slow_call_duration: float = None,
+        window: int = 20,
+        min_calls: int = 10,
+        open_duration: float = 30.0,
+        trial_calls: int = 3,
+        max_in_flight: int = None,
+        statuses=RETRY_STATUSES,
+        listeners: list = None,
+        clock=time.monotonic,
+    ):
+        """
+        :param failure_rate: Share of failed calls in the window that opens the circuit
+        :param slow_call_rate: Share of slow calls in the window that opens the circuit
+        :param slow_call_duration: Seconds from which a call is slow, None to ignore latency
+        :param window: Number of recent calls the rates are computed over
+        :param min_calls: Calls needed in the window before the circuit can open
+        :param open_duration: Seconds an open circuit fails fast before half-opening
+        :param trial_calls: Requests let through by a half-open circuit
+        :param max_in_flight: Maximum number of requests in flight per endpoint (Optional)
+        :param statuses: HTTP status codes counted as failures
+        :param listeners: Callables called with (endpoint, old state, new state) on every
+                          transition, e.g. to alert (Optional)
+        :param clock: Function returning the current time in seconds
+        """
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_duration = slow_call_duration
+        self.window = window
+        self.min_calls = min_calls
+        self.open_duration = open_duration
+        self.trial_calls = trial_calls
+        self.max_in_flight = max_in_flight
+        self.statuses = frozenset(statuses)
+        self.listeners = list(listeners or [])
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._circuits = {}
+        self._stats = {"calls": 0, "failures": 0, "rejected": 0, "shed": 0}
+
+    @property
+    def stats(self) -> dict:
+        """
+        :return: dict with the number of calls let through, failed calls, calls rejected
+                 by an open circuit and calls shed over max_in_flight
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def state(self, endpoint: str) -> str:
+        """
+        :return: CLOSED, OPEN or HALF_OPEN
+        """
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is None:
+                return CLOSED
+            transition = self._half_open(endpoint, circuit)
+        self._notify(transition)
+        return circuit.state
+
+    def reset(self, endpoint: str = None):
+        """
+        Closes the circuit of endpoint, or all of them, forgetting their history
+        """
+        transitions = []
+        with self._lock:
+            endpoints = [endpoint] if endpoint is not None else list(self._circuits)
+            for name in endpoints:
+                circuit = self._circuits.pop(name, None)
+                if circuit is not None and circuit.state != CLOSED:
+                    transitions.append((name, circuit.state, CLOSED))
+        for transition in transitions:
+            self._notify(transition)
+
+    def acquire(self, endpoint: str):
+        """
+        Lets a request to endpoint through, or raises. Every acquire() must be followed by
+        a release() once the request completes.
+        :raises CircuitOpenError: The circuit is open, or half-open with its trials running
+        :raises LoadShedError: max_in_flight requests are in flight on endpoint
+        :return: Start time of the request, to pass to release()
+        """
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is None:
+                circuit = self._circuits[endpoint] = _Circuit(self.window)
+            transition = self._half_open(endpoint, circuit)
+            error = None
+            if circuit.state == OPEN or (
+                circuit.state == HALF_OPEN and circuit.trials >= self.trial_calls
+            ):
+                self._stats["rejected"] += 1
+                error = exceptions.CircuitOpenError(
+                    "Circuit of {endpoint} is {state}, failing fast".format(
+                        endpoint=endpoint, state=circuit.state
+                    )
+                )
+            elif self.max_in_flight and circuit.in_flight >= self.max_in_flight:
+                self._stats["shed"] += 1
+                error = exceptions.LoadShedError(
+                    "{count} requests in flight on {endpoint}, shedding".format(
+                        count=circuit.in_flight, endpoint=endpoint
+                    )
+                )
+            else:
+                self._stats["calls"] += 1
+                circuit.in_flight += 1
+                if circuit.state == HALF_OPEN:
+                    circuit.trials += 1
+        self._notify(transition)
+        if error is not None:
+            raise error
+        return self.clock()
+
+    def release(self, endpoint: str, started: float, response=None, error=None):
+        """
+        Records the outcome of a request let through by acquire(). Without response and
+        error the request is not counted, e.g. when it was interrupted on the client side
+        :param started: What acquire() returned
+        :param response: requests.Response of the call (Optional)
+        :param error: Exception raised by the call (Optional)
+        """
+        failed = error is not None or (
+            response is not None and response.status_code in self.statuses
+        )
+        slow = (
+            self.slow_call_duration is not None
+            and self.clock() - started >= self.slow_call_duration
+        )
+        transition = None
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is None or not circuit.in_flight:
+                # Reset while the call was in flight
+                return
+            circuit.in_flight -= 1
+            if response is None and error is None:
+                if circuit.state == HALF_OPEN and circuit.trials:
+                    circuit.trials -= 1
+                return
+            if failed:
+                self._stats["failures"] += 1
+            if circuit.state == HALF_OPEN:
+                if failed or slow:
+                    transition = self._open(endpoint, circuit)
+                else:
+                    circuit.successes += 1
+                    if circuit.successes >= self.trial_calls:
+                        transition = self._move(endpoint, circuit, CLOSED)
+                        circuit.outcomes.clear()
+            elif circuit.state == CLOSED:
+                circuit.outcomes.append((failed, slow))
+                if self._tripped(circuit.outcomes):
+                    transition = self._open(endpoint, circuit)
+        self._notify(transition)
+
+    def call(self, endpoint: str, send):
+        """
+        :param send: Callable sending the request and returning a requests.Response
+        :return: What send() returned
+        """
+        started = self.acquire(endpoint)
+        try:
+            response = send()
+        except (requests.ConnectionError, requests.Timeout) as err:
+            self.release(endpoint, started, error=err)
+            raise
+        except BaseException:
+            # Not a sign of Newgistics's health, e.g. a KeyboardInterrupt
+            self.release(endpoint, started)
+            raise
+        self.release(endpoint, started, response=response)
+        return response
+
+    def _tripped(self, outcomes) -> bool:
+        if len(outcomes) < self.min_calls:
+            return False
+        failures = sum(1 for failed, _ in outcomes if failed)
+        if failures >= self.failure_rate * len(outcomes):
+            return True
+        if self.slow_call_duration is None:
+            return False
+        slow = sum(1 for _, slow in outcomes if slow)
+        return slow >= self.slow_call_rate * len(outcomes)
+
+    def _open(self, endpoint: str, circuit: _Circuit):
+        circuit.opened_at = self.clock()
+        return self._move(endpoint, circuit, OPEN)
+
+    def _half_open(self, endpoint: str, circuit: _Circuit):
+        if (
+            circuit.state == OPEN
+            and self.clock() - circuit.opened_at >= self.open_duration
+        ):
+            return self._move(endpoint, circuit, HALF_OPEN)
+        return None
+
+    @staticmethod
+    def _move(endpoint: str, circuit: _Circuit, state: str):
+        transition = (endpoint, circuit.state, state)
+        circuit.state = state
+        circuit.trials = 0
+        circuit.successes = 0
+        return transition
+
+    def _notify(self, transition):
+        # Outside the lock, listeners may be slow or call back into the breaker
+        if transition is None:
+            return
+        for listener in self.listeners:
+            listener(*transition)
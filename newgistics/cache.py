@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.cache
+~~~~~~~~~~~~~~~~
+
+In-memory TTL cache with LRU eviction for the responses of read-only fetch endpoints.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache(object):
+    """
+    Caches responses by (API key, endpoint, params), evicting the least recently used entry
+    once maxsize entries are held. Entries expire after the TTL of their endpoint.
+    Cached responses are shared by every caller getting a hit, so treat them as read-only.
+
+    Usage::
+      >>> cache = ResponseCache(maxsize=2048, ttl=60, ttls={'shipments.aspx': 15})
+      >>> ngf_client = NewgisticsFulfillment(api_key='API-KEY', response_cache=cache)
+      >>> cache.stats
+      {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'size': 0}
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 60,
+        ttls: dict = None,
+        clock=time.monotonic,
+    ):
+        """
+        :param maxsize: Maximum number of cached responses
+        :param ttl: Seconds a response stays fresh
+        :param ttls: {endpoint: seconds} overriding ttl for some endpoints
+                     Example: {'shipments.aspx': 15, 'returns.aspx': 300} (Optional)
+        :param clock: Function returning the current time in seconds, time.monotonic by default
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @property
+    def stats(self) -> dict:
+        """
+        :return: dict with the number of hits, misses, LRU evictions, expired entries
+                 and the current size
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            return stats
+
+    @staticmethod
+    def key(api_key: str, endpoint: str, params: dict = None) -> tuple:
+        """
+        Builds the cache key of a request. Parameter names are compared case insensitively
+        and values as strings, the way they end up in the query string.
+        :param api_key: API Key the request is sent with
+        :param endpoint: The resource after the base URL. Example: shipments.aspx
+        :param params: HTTP Request Query Params (Optional)
+        :return: tuple
+        """
+        normalized = tuple(
+            sorted(
+                (str(name).lower(), str(value))
+                for name, value in (params or {}).items()
+                if value is not None
+            )
+        )
+        return api_key, endpoint, normalized
+
+    def get(self, key: tuple):
+        """
+        :param key: Key built by ResponseCache.key
+        :return: The cached response, None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key: tuple, response):
+        """
+        :param key: Key built by ResponseCache.key
+        :param response: Response to cache
+        """
+        ttl = self.ttls.get(key[1], self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(
+        self, api_key: str = None, endpoint: str = None, params: dict = None
+    ):
+        """
+        Drops the cached responses matching all the given filters, everything if none is given
+        :param api_key: Only responses fetched with this API Key (Optional)
+        :param endpoint: Only responses of this endpoint (Optional)
+        :param params: Only responses fetched with at least these params, compared like
+                       in ResponseCache.key. Example: {'id': '4321'} (Optional)
+        :return: Number of responses dropped
+        """
+        wanted = set(self.key(api_key, endpoint, params)[2])
+        with self._lock:
+            stale = [
+                key
+                for key in self._entries
+                if (api_key is None or key[0] == api_key)
+                and (endpoint is None or key[1] == endpoint)
+                and wanted.issubset(key[2])
+            ]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self):
+        """
+        Drops every cached response
+        """
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.cli
+~~~~~~~~~~~~~~
+
+`newgistics` console command.
+
+Usage::
+  $ newgistics import-orders orders.csv --output results.jsonl --concurrency 16
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import exceptions, pool, serialize
+from .fulfillments import _failed_results, _order_results
+
+# Column prefix of the CSV item columns (Item.SKU, Item.Qty, ...)
+ITEM_PREFIX = "Item."
+
+
+class InvalidRow(object):
+    """
+    Stands in for an Order that could not be read, reported as failed without being posted
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: str):
+        self.error = error
+
+    def result(self) -> dict:
+        return {"id": None, "success": False, "errors": [self.error]}
+
+
+def read_jsonl(lines):
+    """
+    :param lines: Iterable of JSON lines, each an Order dict as in Shipment.create()
+    :return: Generator of (line number, Order dict or InvalidRow) tuples
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            order = json.loads(line)
+        except ValueError as err:
+            yield number, InvalidRow("Invalid JSON: {err}".format(err=err))
+            continue
+        if not isinstance(order, dict):
+            yield number, InvalidRow("Not a JSON object")
+            continue
+        yield number, order
+
+
+def read_csv(lines):
+    """
+    Maps CSV rows to Orders. Columns are Order fields, dotted for nested ones
+    (CustomerInfo.FirstName), and Item.<field> for the item of the row (Item.SKU, Item.Qty).
+    Consecutive rows with the same id are one Order with several items.
+    Empty cells are sent as empty elements.
+    :param lines: Iterable of CSV lines, with a header row
+    :return: Generator of (line number of the first row, Order dict) tuples
+    """
+    number, order = None, None
+    for row_number, row in enumerate(csv.DictReader(lines), 2):
+        fields = {}
+        item = {}
+        for column, value in row.items():
+            if column is None:
+                continue
+            value = value if value != "" else None
+            if column.startswith(ITEM_PREFIX):
+                _set_path(item, column[len(ITEM_PREFIX) :], value)
+            else:
+                _set_path(fields, column, value)
+        items = [item] if any(value is not None for value in item.values()) else []
+        order_id = serialize.order_id(fields)
+        if order is not None and order_id and order_id == serialize.order_id(order):
+            order["Items"]["Item"].extend(items)
+            continue
+        if order is not None:
+            yield number, order
+        number, order = row_number, fields
+        order["Items"] = {"Item": items}
+    if order is not None:
+        yield number, order
+
+
+def _set_path(node: dict, path: str, value):
+    *parents, name = path.split(".")
+    for parent in parents:
+        node = node.setdefault(parent, {})
+    node[name] = value
+
+
+def _batches(orders, batch_size: int):
+    batch = []
+    for order in orders:
+        batch.append(order)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def serialize_batch(orders: list, api_key: str) -> str:
+    """
+    Runs in the worker processes
+    :return: Shipment document of the orders
+    """
+    return serialize.orders({"Orders": {"Order": orders}}, api_key=api_key)
+
+
+def parse_results(body: bytes, order_ids: list) -> list:
+    """
+    Runs in the worker processes
+    :return: Per-order results of a post_shipments.aspx response, see Shipment.create_many()
+    """
+    from xml.parsers.expat import ExpatError
+
+    import xmltodict
+
+    try:
+        results = _order_results(xmltodict.parse(body) if body else None, order_ids)
+    except ExpatError as err:
+        # A 2xx body that is not XML, e.g. the error page of a proxy
+        results = _failed_results(
+            order_ids, "Invalid response body: {err}".format(err=err)
+        )
+    for result in results:
+        # Only what is written to the output crosses back to the parent process
+        result.pop("result")
+    return results
+
+
+class _Inline(object):
+    """
+    Stands in for the process pool when --processes is 0
+    """
+
+    def run(self, func, *args):
+        return func(*args)
+
+    def shutdown(self):
+        pass
+
+
+class _Processes(object):
+    def __init__(self, processes: int):
+        kwargs = {}
+        if sys.version_info >= (3, 7):
+            # Workers are not forked from a process whose I/O threads hold sockets and locks
+            methods = multiprocessing.get_all_start_methods()
+            method = "forkserver" if "forkserver" in methods else "spawn"
+            kwargs["mp_context"] = multiprocessing.get_context(method)
+        self.executor = ProcessPoolExecutor(max_workers=processes, **kwargs)
+        # Started now, before import_orders starts its threads, instead of on the first
+        # submit() from one of them
+        for future in [self.executor.submit(os.getpid) for _ in range(processes)]:
+            future.result()
+
+    def run(self, func, *args):
+        return self.executor.submit(func, *args).result()
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def import_orders(
+    client,
+    orders,
+    output,
+    batch_size: int = 100,
+    processes: int = 0,
+    concurrency: int = 8,
+    params: dict = None,
+    progress_interval: float = 5.0,
+    clock=time.monotonic,
+) -> dict:
+    """
+    Creates Shipments for a stream of Orders. Batches are serialized and their responses
+    parsed in a process pool, while up to concurrency threads wait on the HTTP calls.
+    :param client: newgistics.NewgisticsFulfillment object
+    :param orders: Iterable of (line number, Order dict) tuples, see read_csv/read_jsonl.
+                   An InvalidRow instead of the Order is reported as failed
+    :param output: Text file receiving a JSON line per Order (type "order"), progress lines
+                   every progress_interval seconds (type "progress") and a summary
+    :param batch_size: Orders per request
+    :param processes: Worker processes serializing and parsing, None for os.cpu_count().
+                      0, the default, works in-process: serializing an Order costs less
+                      than pickling it to a worker, processes only pay off when the
+                      documents are large and the parsing dominates. Workers are started
+                      with forkserver or spawn, so a calling script needs the
+                      if __name__ == "__main__" guard
+    :param concurrency: Requests in flight
+    :param params: Request parameters of every request (Optional)
+    :param progress_interval: Seconds between two progress lines
+    :param clock: Function returning the current time in seconds
+    :return: dict of the summary
+    """
+    if batch_size < 1:
+        raise exceptions.IncorrectParameterError("batch_size must be at least 1")
+    if processes is None:
+        processes = os.cpu_count() or 1
+    workers = _Processes(processes) if processes > 0 else _Inline()
+    if client._owns_session:
+        pool.ensure_pool_size(client.session, concurrency)
+    shipments = client.shipments
+
+    def post(batch):
+        lines = [number for number, _ in batch]
+        batch_orders = [
+            order for _, order in batch if not isinstance(order, InvalidRow)
+        ]
+        results = []
+        if batch_orders:
+            order_ids = [serialize.order_id(order) for order in batch_orders]
+            try:
+                document = workers.run(serialize_batch, batch_orders, client.api_key)
+                response = shipments._post_batch(
+                    batch_orders, params=params, document=document
+                )
+                if response.ok:
+                    results = workers.run(parse_results, response.content, order_ids)
+                else:
+                    results = shipments._batch_results(response, order_ids)
+            except Exception as err:
+                # Fails this batch only, every row still gets its result line
+                results = _failed_results(
+                    order_ids, "{name}: {err}".format(name=type(err).__name__, err=err)
+                )
+            for result in results:
+                result.pop("result", None)
+        # Rows that could not be read keep their place among the results
+        results = iter(results)
+        return lines, [
+            order.result() if isinstance(order, InvalidRow) else next(results)
+            for _, order in batch
+        ]
+
+    started = clock()
+    last_progress = started
+    counts = {"orders": 0, "succeeded": 0, "failed": 0, "batches": 0}
+
+    def progress(kind: str) -> dict:
+        elapsed = clock() - started
+        return dict(
+            counts,
+            type=kind,
+            elapsed=round(elapsed, 3),
+            orders_per_s=round(counts["orders"] / elapsed, 3) if elapsed else None,
+        )
+
+    try:
+        for result in pool.map_calls(
+            post, _batches(orders, batch_size), workers=concurrency, ordered=False
+        ):
+            counts["batches"] += 1
+            if result["error"] is not None:
+                lines = [number for number, _ in result["params"]]
+                results = [
+                    (
+                        order.result()
+                        if isinstance(order, InvalidRow)
+                        else {
+                            "id": serialize.order_id(order),
+                            "success": False,
+                            "errors": [str(result["error"])],
+                        }
+                    )
+                    for _, order in result["params"]
+                ]
+            else:
+                lines, results = result["response"]
+            for line, order_result in zip(lines, results):
+                counts["orders"] += 1
+                counts["succeeded" if order_result["success"] else "failed"] += 1
+                _write(output, dict(order_result, type="order", line=line))
+            if clock() - last_progress >= progress_interval:
+                last_progress = clock()
+                _write(output, progress("progress"))
+                output.flush()
+    finally:
+        workers.shutdown()
+
+    summary = progress("summary")
+    _write(output, summary)
+    output.flush()
+    return summary
+
+
+def _write(output, record: dict):
+    output.write(json.dumps(record, default=str) + "\n")
+
+
+def _open_input(path: str):
+    if path == "-":
+        # A file object of its own over stdin, closing it leaves sys.stdin open
+        return open(sys.stdin.fileno(), newline="", encoding="utf-8-sig", closefd=False)
+    return open(path, newline="", encoding="utf-8-sig")
+
+
+def _command_import_orders(args) -> int:
+    from .fulfillments import Fulfillment
+
+    input_format = args.format
+    if input_format is None:
+        input_format = "csv" if args.input.lower().endswith(".csv") else "jsonl"
+    reader = read_csv if input_format == "csv" else read_jsonl
+    params = dict(param.split("=", 1) for param in args.param or [])
+
+    with _open_input(args.input) as input_file, Fulfillment(
+        api_key=args.api_key, staging=args.staging, pool_maxsize=args.concurrency
+    ) as client:
+        output = sys.stdout if args.output == "-" else open(args.output, "w")
+        try:
+            summary = import_orders(
+                client,
+                reader(input_file),
+                output,
+                batch_size=args.batch_size,
+                processes=args.processes,
+                concurrency=args.concurrency,
+                params=params or None,
+                progress_interval=args.progress_interval,
+            )
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    print(
+        "{orders} orders, {failed} failed, {rate} orders/s".format(
+            orders=summary["orders"],
+            failed=summary["failed"],
+            rate=summary["orders_per_s"],
+        ),
+        file=sys.stderr,
+    )
+    return 1 if summary["failed"] else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="newgistics", description="Newgistics API client"
+    )
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    importer = commands.add_parser(
+        "import-orders",
+        help="create Shipments from a CSV or JSONL file of orders",
+        description=read_csv.__doc__.split(":param")[0],
+    )
+    importer.add_argument("input", help="CSV or JSONL file of orders, - for stdin")
+    importer.add_argument(
+        "--format", choices=("csv", "jsonl"), help="guessed from the file extension"
+    )
+    importer.add_argument(
+        "--output", default="-", help="JSONL file of the results, stdout by default"
+    )
+    importer.add_argument(
+        "--api-key",
+        default=os.environ.get("NG_FL_API_KEY"),
+        help="NG_FL_API_KEY by default",
+    )
+    importer.add_argument("--staging", action="store_true")
+    importer.add_argument("--batch-size", type=int, default=100)
+    importer.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="serializing/parsing processes, 0 (default) to work in-process",
+    )
+    importer.add_argument(
+        "--concurrency", type=int, default=8, help="requests in flight"
+    )
+    importer.add_argument(
+        "--param", action="append", help="request parameter name=value, repeatable"
+    )
+    importer.add_argument("--progress-interval", type=float, default=5.0)
+    importer.set_defaults(func=_command_import_orders)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
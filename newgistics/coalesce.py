@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.coalesce
+~~~~~~~~~~~~~~~~~~~
+
+Request coalescing for the fetch endpoints: identical concurrent GETs share one HTTP call
+(single-flight), and single-id fetches arriving within a few milliseconds can be merged
+into one request for several ids (micro-batching).
+"""
+
+import threading
+
+
+class _Call(object):
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Batch(object):
+    __slots__ = ("ids", "full", "done", "results", "error")
+
+    def __init__(self):
+        self.ids = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Makes concurrent identical fetches of a client share one in-flight request: the first
+    caller sends it, the others wait and get the same ParsedResponse (or exception).
+    Nothing is kept once the request completes, see newgistics.cache for that.
+
+    With batch, fetches whose only parameter is the id parameter of their endpoint are
+    held for up to window seconds and sent together as one request for all the ids,
+    joined with separator, for endpoints accepting several ids. The response is split
+    back into one response per id, holding the records whose id attribute matches.
+
+    Usage::
+      >>> single_flight = SingleFlight(batch={'shipments.aspx': ('id', 'Shipment')})
+      >>> ngf_client = NewgisticsFulfillment(api_key='API-KEY', single_flight=single_flight)
+      >>> single_flight.stats
+      {'requests': 0, 'coalesced': 0, 'batches': 0, 'batched': 0}
+    """
+
+    def __init__(
+        self,
+        batch: dict = None,
+        window: float = 0.005,
+        max_batch: int = 50,
+        separator: str = ",",
+    ):
+        """
+        :param batch: {endpoint: (id parameter, record tag)} of the endpoints to batch
+                      Example: {'shipments.aspx': ('id', 'Shipment')} (Optional)
+        :param window: Seconds a batch waits for more ids after its first one
+        :param max_batch: Maximum number of ids per batched request
+        :param separator: Joins the ids of a batch in the id parameter
+        """
+        self.batch = {
+            endpoint: (param.lower(), tag)
+            for endpoint, (param, tag) in (batch or {}).items()
+        }
+        self.window = window
+        self.max_batch = max_batch
+        self.separator = separator
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._batches = {}
+        self._stats = {"requests": 0, "coalesced": 0, "batches": 0, "batched": 0}
+
+    @property
+    def stats(self) -> dict:
+        """
+        :return: dict with the number of distinct fetches made, fetches that joined one
+                 in flight, batched requests sent and the id fetches that went into them
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def do(self, key, func):
+        """
+        Calls func(), unless a call with the same key is in flight: then waits for it
+        :param key: Hashable identity of the call, e.g. ResponseCache.key(...)
+        :param func: Callable without arguments
+        :return: What func() returned, to every caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["requests"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def batch_param(self, endpoint: str, params: dict):
+        """
+        :return: (id parameter, record tag, id) when the fetch can be batched, else None
+        """
+        spec = self.batch.get(endpoint)
+        if spec is None or not params or len(params) != 1:
+            return None
+        name, value = next(iter(params.items()))
+        if str(name).lower() != spec[0] or value is None:
+            return None
+        return name, spec[1], str(value)
+
+    def batched(self, key, record_id: str, fetch_many):
+        """
+        Adds record_id to the open batch of key, the first caller of a batch sending it
+        :param key: Identity of the batch queue, e.g. (api key, endpoint, id parameter)
+        :param record_id: Id fetched by this caller
+        :param fetch_many: Callable taking a list of ids and returning {id: response}
+        :return: The response for record_id
+        """
+        with self._lock:
+            batch = self._batches.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._batches[key] = _Batch()
+            if record_id not in batch.ids:
+                batch.ids.append(record_id)
+            self._stats["batched"] += 1
+            if len(batch.ids) >= self.max_batch:
+                # Full, later callers start a new batch
+                del self._batches[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._batches.get(key) is batch:
+                    del self._batches[key]
+                self._stats["batches"] += 1
+            try:
+                batch.results = fetch_many(list(batch.ids))
+            except BaseException as err:
+                batch.error = err
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[record_id]
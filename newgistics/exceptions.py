@@ -7,17 +7,48 @@ newgistics.exceptions
 This module contains all the custom defined exceptions.
 """
 
+from xml.parsers.expat import ExpatError
+
+# json_body of an exception whose body was not parsed yet
+_UNPARSED = object()
+
 
 class NewgisticsException(Exception):
     def __init__(self, message=None, response=None):
         super(NewgisticsException, self).__init__(message)
-        if response:
-            http_body = response.text
-            http_status = response.status_code
-            json_body = response.json()
-            self.http_body = http_body
-            self.http_status = http_status
-            self.json_body = json_body
+        # The body is only read if http_body or json_body is
+        self.response = response
+        self.http_status = response.status_code if response is not None else None
+        self._json_body = _UNPARSED
+
+    @property
+    def http_body(self):
+        """
+        :return: Body of the error response as text, None without a response
+        """
+        if self.response is None:
+            return None
+        return self.response.text
+
+    @property
+    def json_body(self):
+        """
+        :return: Body of the error response parsed by xmltodict on first access, None
+                 without a response or for a body that is not XML (an HTML error page)
+        """
+        if self._json_body is _UNPARSED:
+            from .response import ParsedResponse
+
+            self._json_body = None
+            if self.response is not None:
+                response = self.response
+                if not isinstance(response, ParsedResponse):
+                    response = ParsedResponse(response)
+                try:
+                    self._json_body = response.dict
+                except ExpatError:
+                    pass
+        return self._json_body
 
 
 class ResourceEntityNotFound(NewgisticsException):
@@ -54,3 +85,88 @@ class InvalidFormat(NewgisticsException):
 
 class InvalidAccessType(NewgisticsException):
     pass
+
+
+class BadRequestError(IncorrectParameterError):
+    pass
+
+
+class TooManyRequestsError(NewgisticsException):
+    pass
+
+
+class ServiceUnavailableError(InternalServerError):
+    pass
+
+
+class CircuitOpenError(NewgisticsException):
+    """
+    Raised without sending the request while the endpoint's circuit is open,
+    see newgistics.breaker
+    """
+
+
+class LoadShedError(NewgisticsException):
+    """
+    Raised without sending the request when too many are in flight on the endpoint,
+    see newgistics.breaker
+    """
+
+
+class ReplayMissError(NewgisticsException):
+    """
+    Raised by newgistics.transport.ReplayAdapter for a request it has no recorded response for
+    """
+
+
+# Exception raised by process() for an HTTP error status, see exception_class()
+STATUS_EXCEPTIONS = {
+    400: BadRequestError,
+    401: AccessNotGrantedError,
+    403: AuthenticationParameterError,
+    404: ResourceEntityNotFound,
+    422: AuthenticationParameterError,
+    429: TooManyRequestsError,
+    500: InternalServerError,
+    502: ServiceUnavailableError,
+    503: ServiceUnavailableError,
+    504: ServiceUnavailableError,
+}
+
+
+def exception_class(status_code: int):
+    """
+    :return: Exception class raised for status_code, InternalServerError for the other
+             5xx, NewgisticsException for the other 4xx, None below 400
+    """
+    exception = STATUS_EXCEPTIONS.get(status_code)
+    if exception is not None:
+        return exception
+    if status_code >= 500:
+        return InternalServerError
+    if status_code >= 400:
+        return NewgisticsException
+    return None
+
+
+def from_response(response):
+    """
+    Builds the exception of an HTTP error response from its status alone, the body is
+    left unread
+    :param response: newgistics.response.ParsedResponse with a status of 400 or more
+    :return: NewgisticsException object, wrapping a requests.HTTPError like
+             raise_for_status() raises
+    """
+    import requests
+
+    kind = "Server" if response.status_code >= 500 else "Client"
+    http_err = requests.HTTPError(
+        "{status} {kind} Error: {reason} for url: {url}".format(
+            status=response.status_code,
+            kind=kind,
+            reason=response.reason,
+            url=response.url,
+        ),
+        response=response.response,
+    )
+    return exception_class(response.status_code)(http_err, response)
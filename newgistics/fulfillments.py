@@ -7,25 +7,87 @@ newgistics.fulfillments
 This module contains the resource wrapper for Newgistics Fulfillments System.
 """
 
+import copy
 import os
-import json
+from contextlib import closing
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import islice
+from typing import TYPE_CHECKING
+from xml.etree import ElementTree
+from xml.parsers.expat import ExpatError
 
 import requests
-import xmltodict
 
-from .auth import FulfillmentAuth
-from . import exceptions
+from .auth import FulfillmentAuth, RequestTemplate
+from . import (
+    breaker,
+    cache,
+    coalesce,
+    exceptions,
+    metrics,
+    models,
+    pool,
+    ratelimit,
+    retry,
+    serialize,
+    streaming,
+)
+from .response import ParsedResponse
+
+if TYPE_CHECKING:
+    # For the annotation only, importing it would load sqlite3 for every client
+    from .outbox import Outbox
+
+# Format of the datetimes sent as start/end timestamps by iter_range
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# Error of the orders a post_shipments.aspx response neither accepts nor rejects
+UNCONFIRMED = "Newgistics did not confirm the order"
 
 
 class Fulfillment(object):
     def __init__(
-        self, api_key: str = os.environ.get("NG_FL_API_KEY"), staging: bool = False
+        self,
+        api_key: str = os.environ.get("NG_FL_API_KEY"),
+        staging: bool = False,
+        session: requests.Session = None,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        timeout=pool.DEFAULT_TIMEOUT,
+        retry_policy: retry.RetryPolicy = None,
+        rate_limiter: ratelimit.RateLimiter = None,
+        hooks: list = None,
+        response_cache: cache.ResponseCache = None,
+        outbox: "Outbox" = None,
+        single_flight: coalesce.SingleFlight = None,
+        circuit_breaker: breaker.CircuitBreaker = None,
+        transport=None,
     ):
         """
         Python client for Newgistics REST Web API
         :param api_key: API Key for Newgistics Fulfillments API
                         (provided by your Newgistics's account manager).
         :param staging: False if in production else True
+        :param session: requests.Session to share a connection pool between clients, its
+                        adapters are used as they are: size their pools for the workers or
+                        concurrency used (Optional)
+        :param pool_connections: Number of hosts to pool connections for, ignored when a session is given
+        :param pool_maxsize: Connections kept alive per host, ignored when a session is given
+        :param timeout: Default timeout of a request in seconds, a float or a (connect, read) tuple
+        :param retry_policy: newgistics.retry.RetryPolicy, 3 attempts with backoff by default
+        :param rate_limiter: newgistics.ratelimit.RateLimiter, may be shared by clients (Optional)
+        :param hooks: Callables receiving a newgistics.metrics.RequestEvent per request,
+                      e.g. a newgistics.metrics.MetricsAggregator (Optional)
+        :param response_cache: newgistics.cache.ResponseCache caching fetch responses (Optional)
+        :param outbox: newgistics.outbox.Outbox storing the Orders of shipments.enqueue (Optional)
+        :param single_flight: newgistics.coalesce.SingleFlight sharing concurrent identical
+                              fetches, and batching id fetches if configured to (Optional)
+        :param circuit_breaker: newgistics.breaker.CircuitBreaker failing requests fast while
+                                an endpoint fails, may be shared by clients (Optional)
+        :param transport: requests adapter sending the requests, e.g. a
+                          newgistics.transport.RecordingAdapter or ReplayAdapter,
+                          ignored when a session is given (Optional)
 
         Usage::
           >>> from newgistics import NewgisticsFulfillment
@@ -38,7 +100,19 @@ class Fulfillment(object):
         self.api_key = api_key
         self.staging_url = "https://apistaging.newgisticsfulfillment.com"
         self.production_url = "https://api.newgisticsfulfillment.com"
-        self.session = requests.Session().request
+        self.timeout = timeout
+        self.retry_policy = retry_policy or retry.RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.hooks = list(hooks or [])
+        self.response_cache = response_cache
+        self.outbox = outbox
+        self.single_flight = single_flight
+        self.circuit_breaker = circuit_breaker
+        self.session = session or pool.make_session(
+            pool_connections, pool_maxsize, adapter=transport
+        )
+        self._owns_session = session is None
+        self._request_template = None
         self.returns = Return(self)
         self.inbound_returns = InboundReturn(self)
         self.shipments = Shipment(self)
@@ -49,6 +123,63 @@ class Fulfillment(object):
             return self.staging_url
         return self.production_url
 
+    @property
+    def request_template(self) -> RequestTemplate:
+        """
+        :return: newgistics.auth.RequestTemplate of the current api_endpoint and api_key
+        """
+        key = (self.api_endpoint, self.api_key)
+        if self._request_template is None or self._request_template[0] != key:
+            template = FulfillmentAuth(api_key=self.api_key).template(
+                self.api_endpoint, session=self.session
+            )
+            self._request_template = (key, template)
+        return self._request_template[1]
+
+    def close(self):
+        """
+        Stops the outbox worker and closes the pooled connections, unless the session was
+        passed in by the caller
+        """
+        if self.outbox is not None:
+            self.outbox.stop()
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def map_fetch(self, resource, param_iter, workers: int = 8, ordered: bool = True):
+        """
+        Runs resource.fetch(params=...) for every params dict over a thread pool.
+        The connection pool of the session is grown to workers connections.
+        :param resource: Resource name (shipments, returns, inbound_returns) or object
+        :param param_iter: Iterable of HTTP Request Parameters, read lazily
+        :param workers: Number of threads
+        :param ordered: Yield results in the order of param_iter if True, else as they complete
+        :return: Generator of dicts {'params': params,
+                                     'response': newgistics.response.ParsedResponse or None,
+                                     'error': the exception raised by fetch or None}
+
+        Usage::
+          >>> for result in ngf_client.map_fetch('shipments', ({'id': id} for id in ids), workers=16):
+          ...     if result['error'] is None:
+          ...         print(result['response'].dict)
+        """
+        if isinstance(resource, str):
+            resource = getattr(self, resource)
+        if self._owns_session:
+            pool.ensure_pool_size(self.session, workers)
+        return pool.map_calls(
+            lambda params: resource.fetch(params=params),
+            param_iter,
+            workers=workers,
+            ordered=ordered,
+        )
+
 
 class BaseClient(object):
     """
@@ -63,52 +194,197 @@ class BaseClient(object):
         :param method_name: HTTP Method Name. Example: GET POST
         :param resource_endpoint: The resource after the base URL
         :param dict_payload: HTTP Request Payload (Optional)
+        :param serializer: Turns dict_payload into XML, serialize.unparse by default (Optional)
         :param query_params: HTTP Request Query Params (Optional)
         :param headers: HTTP Request Headers (Optional)
+        :param timeout: Overrides the client's default timeout (Optional)
+        :param idempotent: Whether the request may be retried, guessed from the method by default (Optional)
+        :param stream: Defer downloading the response body (Optional)
         :return: requests.Response object
         """
 
         dict_payload = kwargs.get("dict_payload")
         query_params = kwargs.get("query_params")
         headers = kwargs.get("headers")
+        stream = kwargs.get("stream", False)
+        serializer = kwargs.get("serializer", serialize.unparse)
+        timer = None
+        if self.client.hooks:
+            timer = metrics.RequestTimer(
+                method_name, resource_endpoint, self.client.hooks
+            )
         xml_payload = None
         if dict_payload:
-            xml_payload = xmltodict.unparse(dict_payload)
-        request_params = {
-            "url": "{api_endpoint}/{resource_endpoint}".format(
-                api_endpoint=self.client.api_endpoint,
-                resource_endpoint=resource_endpoint,
-            ),
-            "data": xml_payload,
-            "auth": FulfillmentAuth(api_key=self.client.api_key),
-            "params": query_params,
-            "headers": headers,
+            if timer is not None:
+                xml_payload = timer.serialize(serializer, dict_payload)
+            else:
+                xml_payload = serializer(dict_payload)
+        template = self.client.request_template
+        prepared = template.prepare(
+            method_name,
+            resource_endpoint,
+            params=query_params,
+            data=xml_payload,
+            headers=headers,
+        )
+        send_kwargs = {
+            "timeout": kwargs.get("timeout", self.client.timeout),
+            "stream": stream,
         }
-        req = self.client.session(method_name, **request_params)
+
+        def send():
+            if self.client.rate_limiter is not None:
+                self.client.rate_limiter.acquire(self.client.api_key, resource_endpoint)
+            if self.client.circuit_breaker is not None:
+                return self.client.circuit_breaker.call(resource_endpoint, attempt)
+            return attempt()
+
+        def attempt():
+            if timer is not None:
+                return timer.send(
+                    lambda: template.send(prepared, **send_kwargs),
+                    self.client.session,
+                    prepared.url,
+                )
+            return template.send(prepared, **send_kwargs)
+
+        if timer is None:
+            return self.client.retry_policy.send(
+                send, method_name, idempotent=kwargs.get("idempotent")
+            )
+        try:
+            req = self.client.retry_policy.send(
+                send, method_name, idempotent=kwargs.get("idempotent")
+            )
+        except Exception:
+            timer.done()
+            raise
+        timer.done(req)
         return req
 
-    @staticmethod
-    def process(response: requests.Response):
+    def _fetch(self, resource_endpoint: str, params: dict = None) -> ParsedResponse:
+        """
+        GETs a resource, going through the client's response cache and single-flight
+        group when it has them
+        :param resource_endpoint: The resource after the base URL
+        :param params: HTTP Request Query Params (Optional)
+        :return: newgistics.response.ParsedResponse object
+        """
 
-        parsed_dict = xmltodict.parse(response.content)
-        response._content = str.encode(json.dumps(parsed_dict))
-        try:
-            response.raise_for_status()
-        except requests.HTTPError as http_err:
-            status_code = http_err.response.status_code
-            if status_code == 401:
-                raise exceptions.AccessNotGrantedError(http_err, response)
-            if status_code == 403:
-                raise exceptions.AuthenticationParameterError(http_err, response)
-            if status_code == 404:
-                raise exceptions.ResourceEntityNotFound(http_err, response)
-            if status_code == 422:
-                raise exceptions.AuthenticationParameterError(http_err, response)
-            if status_code == 500:
-                raise exceptions.InternalServerError(http_err, response)
-        except requests.RequestException as req_err:
-            raise exceptions.NewgisticsException(req_err, response)
+        response_cache = self.client.response_cache
+        single_flight = self.client.single_flight
+        key = cache.ResponseCache.key(self.client.api_key, resource_endpoint, params)
+        if response_cache is not None:
+            response = response_cache.get(key)
+            if response is not None:
+                return response
+
+        def fetch():
+            batch = None
+            if single_flight is not None:
+                batch = single_flight.batch_param(resource_endpoint, params)
+            if batch is not None:
+                name, record_tag, record_id = batch
+                response = single_flight.batched(
+                    (self.client.api_key, resource_endpoint, name.lower()),
+                    record_id,
+                    partial(self._fetch_ids, resource_endpoint, name, record_tag),
+                )
+            else:
+                response = self.process(
+                    self._make_request(
+                        "GET", resource_endpoint=resource_endpoint, query_params=params
+                    )
+                )
+            if response_cache is not None:
+                response_cache.set(key, response)
+            return response
+
+        if single_flight is None:
+            return fetch()
+        return single_flight.do(key, fetch)
+
+    def _fetch_ids(
+        self, resource_endpoint: str, param: str, record_tag: str, ids: list
+    ) -> dict:
+        """
+        GETs the records of several ids in one request and splits the response by id
+        :param param: Name of the id parameter
+        :param record_tag: Tag name of the records. Example: Shipment
+        :param ids: Ids to fetch, joined with the single-flight group's separator
+        :return: {id: newgistics.response.ParsedResponse object}
+        """
+
+        if len(ids) == 1:
+            params = {param: ids[0]}
+        else:
+            params = {param: self.client.single_flight.separator.join(ids)}
+        response = self.process(
+            self._make_request(
+                "GET", resource_endpoint=resource_endpoint, query_params=params
+            )
+        )
+        if len(ids) == 1:
+            return {ids[0]: response}
+        return {
+            record_id: ParsedResponse(split)
+            for record_id, split in _split_records(
+                response.response, record_tag, ids
+            ).items()
+        }
+
+    def _invalidate_shipments(self, order_ids):
+        """
+        Drops the cached shipments.aspx responses fetched for the given order ids
+        """
 
+        response_cache = self.client.response_cache
+        if response_cache is None:
+            return
+        for order_id in order_ids:
+            if order_id is not None:
+                response_cache.invalidate(
+                    self.client.api_key, "shipments.aspx", params={"id": order_id}
+                )
+
+    def _iter_fetch(
+        self,
+        resource_endpoint: str,
+        record_tag: str,
+        params: dict = None,
+        model: models.Record = None,
+    ):
+        """
+        Streams a GET response and yields its records one at a time
+        :param resource_endpoint: The resource after the base URL
+        :param record_tag: Tag name of the records to yield. Example: Shipment
+        :param params: HTTP Request Query Params (Optional)
+        :param model: Yield objects of this newgistics.models class instead of dicts (Optional)
+        :return: Generator of OrderedDict or model objects
+        """
+
+        response = self._make_request(
+            "GET", resource_endpoint=resource_endpoint, query_params=params, stream=True
+        )
+        with closing(response):
+            if not response.ok:
+                # Error bodies are small, downloaded before the stream is closed so the
+                # exception process() raises can still read them
+                response.content
+                self.process(response)
+            chunks = response.iter_content(chunk_size=streaming.CHUNK_SIZE)
+            if model is not None:
+                yield from models.iter_models(chunks, model)
+            else:
+                yield from streaming.iter_records(chunks, tag=record_tag)
+
+    @staticmethod
+    def process(response: requests.Response) -> ParsedResponse:
+
+        # Only the status is checked, bodies are parsed when read (.dict, json_body)
+        response = ParsedResponse(response)
+        if response.status_code >= 400:
+            raise exceptions.from_response(response)
         return response
 
 
@@ -117,29 +393,151 @@ class InboundReturn(BaseClient):
     The resource class which communicates with the Return API.
     Functionalities under this class:
         Fetch InboundReturn(s)
+        Fetch InboundReturn(s) over a time range, window by window
     """
 
-    def fetch(self, params: dict = None) -> requests.Response:
+    def fetch(self, params: dict = None) -> ParsedResponse:
         """
         Fetches Inbound Return(s)
         :param params: HTTP Request Parameters (Optional)
-        :return: requests.Response object
+        :return: newgistics.response.ParsedResponse object
 
         Usage::
           >>> ngf_client.inbound_returns.create(params={})
         """
-        resource = "inbound_returns.aspx"
-        response = self._make_request(
-            "GET", resource_endpoint=resource, query_params=params
+        return self._fetch("inbound_returns.aspx", params=params)
+
+    def iter_range(
+        self,
+        start: datetime,
+        end: datetime,
+        window: timedelta = timedelta(days=1),
+        params: dict = None,
+        workers: int = 1,
+        max_records: int = None,
+        min_window: timedelta = timedelta(minutes=1),
+    ):
+        """
+        Fetches Inbound Return(s) created between start and end, one sub-window per request.
+        A window that times out, fails with a 500 or holds more than max_records records is
+        halved and fetched again, down to min_window. Records repeated on the boundary of
+        two windows are yielded once.
+        :param start: Start of the created timestamp range
+        :param end: End of the created timestamp range
+        :param window: Length of the sub-windows
+        :param params: Other HTTP Request Parameters (Optional)
+        :param workers: Number of windows fetched concurrently
+        :param max_records: Split windows returning more records than this (Optional)
+        :param min_window: Windows are not split below this length
+        :return: Generator of OrderedDict objects, in window order
+
+        Usage::
+          >>> for inbound_return in ngf_client.inbound_returns.iter_range(
+          ...         datetime(2019, 4, 1), datetime(2019, 5, 1), window=timedelta(hours=6)):
+          ...     print(inbound_return)
+        """
+        if window <= timedelta(0):
+            raise exceptions.IncorrectParameterError("window must be positive")
+
+        def windows():
+            window_start = start
+            while window_start < end:
+                window_end = min(window_start + window, end)
+                yield window_start, window_end
+                window_start = window_end
+
+        def fetch_window(bounds):
+            return self._fetch_window(
+                *bounds, params=params, max_records=max_records, min_window=min_window
+            )
+
+        if workers > 1:
+            if self.client._owns_session:
+                pool.ensure_pool_size(self.client.session, workers)
+            batches = (
+                _unwrap(result)
+                for result in pool.map_calls(fetch_window, windows(), workers=workers)
+            )
+        else:
+            batches = (fetch_window(bounds) for bounds in windows())
+
+        previous = set()
+        for records in batches:
+            current = set()
+            for record in records:
+                key = _record_key(record)
+                if key in previous or key in current:
+                    continue
+                current.add(key)
+                yield record
+            previous = current
+
+    def _fetch_window(
+        self,
+        start: datetime,
+        end: datetime,
+        params: dict = None,
+        max_records: int = None,
+        min_window: timedelta = None,
+    ) -> list:
+        """
+        Fetches the Inbound Return(s) of one window, halving it while it is too large
+        :return: list of OrderedDict objects
+        """
+        can_split = end - start > min_window
+        try:
+            records = self._read_window(
+                start,
+                end,
+                params=params,
+                max_records=max_records if can_split else None,
+            )
+        except (
+            requests.Timeout,
+            requests.ConnectionError,
+            exceptions.InternalServerError,
+        ):
+            if not can_split:
+                raise
+            records = None
+        if records is not None:
+            return records
+        middle = start + (end - start) / 2
+        return self._fetch_window(
+            start, middle, params=params, max_records=max_records, min_window=min_window
+        ) + self._fetch_window(
+            middle, end, params=params, max_records=max_records, min_window=min_window
         )
-        return self.process(response)
 
-    def create(self, payload: dict = None, params: dict = None) -> requests.Response:
+    def _read_window(
+        self,
+        start: datetime,
+        end: datetime,
+        params: dict = None,
+        max_records: int = None,
+    ):
+        """
+        :return: list of OrderedDict objects, None once more than max_records were read
+        """
+        params = dict(params or {})
+        params["startCreatedTimestamp"] = start.strftime(TIMESTAMP_FORMAT)
+        params["endCreatedTimestamp"] = end.strftime(TIMESTAMP_FORMAT)
+        records = []
+        with closing(
+            self._iter_fetch("inbound_returns.aspx", None, params=params)
+        ) as it:
+            for record in it:
+                if max_records is not None and len(records) >= max_records:
+                    return None
+                records.append(record)
+        return records
+
+    def create(self, payload: dict = None, params: dict = None) -> ParsedResponse:
         """
         Create Inbound Return
         :param: HTTP Request Parameters (Optional)
         :payload: HTTP Request Payload (Optional)
-        :return: requests.Response object
+        :return: newgistics.response.ParsedResponse object
 
         Usage::
           >>> ngf_client.inbound_returns.create(payload={}, params={})
@@ -151,26 +549,13 @@ class InboundReturn(BaseClient):
            'Items': {'Item': [{'Qty': 10, 'Reason': 'Some_Reason', 'SKU': 'HLU'}]},
            'RMA': '1234'}}}
         """
-        payload["Returns"]["@apiKey"] = self.client.api_key
-        if not payload["Returns"]["Return"].get("@id") and payload["Returns"][
-            "Return"
-        ].get("id"):
-            # Where shipment id exists
-            payload["Returns"]["Return"]["@id"] = payload["Returns"]["Return"].pop("id")
-        elif not payload["Returns"]["Return"].get("@orderID") and payload["Returns"][
-            "Return"
-        ].get("orderID"):
-            # Where order id  exists
-            payload["Returns"]["Return"]["@orderID"] = payload["Returns"]["Return"].pop(
-                "orderID"
-            )
-
         resource = "post_inbound_returns.aspx"
         response = self._make_request(
             "POST",
             resource_endpoint=resource,
             query_params=params,
             dict_payload=payload,
+            serializer=partial(serialize.returns, api_key=self.client.api_key),
         )
         return self.process(response)
 
@@ -180,23 +565,43 @@ class Return(BaseClient):
     The resource class which communicates with the Return API.
     Functionalities under this class:
         Fetch Return(s)
+        Stream Return(s)
     """
 
-    def fetch(self, params: dict = None) -> requests.Response:
+    def fetch(self, params: dict = None, as_models: bool = False):
         """
         Fetches Return(s)
         :param params: HTTP Request Parameters (Optional)
-        :return: requests.Response object
+        :param as_models: Return a list of newgistics.models.Return objects instead
+        :return: newgistics.response.ParsedResponse object
 
         Usage::
           >>> ngf_client.returns.fetch(params={})
         """
 
-        resource = "returns.aspx"
-        response = self._make_request(
-            "GET", resource_endpoint=resource, query_params=params
+        response = self._fetch("returns.aspx", params=params)
+        if as_models:
+            return list(models.iter_models([response.raw], models.Return))
+        return response
+
+    def iter_fetch(self, params: dict = None, as_models: bool = False):
+        """
+        Streams Return(s), parsing one <Return> at a time to keep memory flat
+        :param params: HTTP Request Parameters (Optional)
+        :param as_models: Yield newgistics.models.Return objects instead of dicts
+        :return: Generator of OrderedDict objects
+
+        Usage::
+          >>> for ret in ngf_client.returns.iter_fetch(params={}):
+          ...     print(ret["@id"])
+        """
+
+        return self._iter_fetch(
+            "returns.aspx",
+            record_tag="Return",
+            params=params,
+            model=models.Return if as_models else None,
         )
-        return self.process(response)
 
 
 class Shipment(BaseClient):
@@ -204,30 +609,51 @@ class Shipment(BaseClient):
     The resource class which communicates with the Shipments API.
     Functionalities under this class:
         Fetch Shipment(s)
+        Stream Shipment(s)
         Create Shipment
+        Create Shipments in bulk
     """
 
-    def fetch(self, params: dict = None) -> requests.Response:
+    def fetch(self, params: dict = None, as_models: bool = False):
         """
         Fetches Shipment(s)
         :param params: HTTP Request Parameters (Optional)
-        :return: requests.Response object
+        :param as_models: Return a list of newgistics.models.Shipment objects instead
+        :return: newgistics.response.ParsedResponse object
 
         Usage::
           >>> ngf_client.shipments.create(params={})
         """
-        resource = "shipments.aspx"
-        response = self._make_request(
-            "GET", resource_endpoint=resource, query_params=params
+        response = self._fetch("shipments.aspx", params=params)
+        if as_models:
+            return list(models.iter_models([response.raw], models.Shipment))
+        return response
+
+    def iter_fetch(self, params: dict = None, as_models: bool = False):
+        """
+        Streams Shipment(s), parsing one <Shipment> at a time to keep memory flat
+        :param params: HTTP Request Parameters (Optional)
+        :param as_models: Yield newgistics.models.Shipment objects instead of dicts
+        :return: Generator of OrderedDict objects
+
+        Usage::
+          >>> for shipment in ngf_client.shipments.iter_fetch(params={}):
+          ...     print(shipment["@id"])
+        """
+
+        return self._iter_fetch(
+            "shipments.aspx",
+            record_tag="Shipment",
+            params=params,
+            model=models.Shipment if as_models else None,
         )
-        return self.process(response)
 
-    def create(self, payload: dict = None, params: dict = None) -> requests.Response:
+    def create(self, payload: dict = None, params: dict = None) -> ParsedResponse:
         """
         Creates Shipment
         :param params: Request parameters
         :param payload: Request payload
-        :return: requests.Response object
+        :return: newgistics.response.ParsedResponse object
 
         Usage::
           >>> ngf_client.shipments.create(payload={}, params={})
@@ -252,17 +678,311 @@ class Shipment(BaseClient):
                                'RequiresSignature': False,
                                'id': '4321'}}}
         """
-        payload["Orders"]["@apiKey"] = self.client.api_key
-        if not payload["Orders"]["Order"].get("@id") and payload["Orders"]["Order"].get(
-            "id"
-        ):
-            payload["Orders"]["Order"]["@id"] = payload["Orders"]["Order"]["id"]
+        orders = _orders_of(payload)
 
         resource = "post_shipments.aspx"
         response = self._make_request(
             "POST",
             resource_endpoint=resource,
             dict_payload=payload,
+            serializer=partial(serialize.orders, api_key=self.client.api_key),
             query_params=params,
+            idempotent=not any(_allows_duplicate(order) for order in orders),
         )
+        self._invalidate_shipments([serialize.order_id(order) for order in orders])
         return self.process(response)
+
+    def create_many(self, orders, batch_size: int = 100, params: dict = None) -> list:
+        """
+        Creates Shipments in bulk, posting up to batch_size Orders per request
+        :param orders: Iterable of Order dicts, each shaped like payload['Orders']['Order'] of create()
+        :param batch_size: Maximum number of Orders sent in a single request
+        :param params: Request parameters
+        :return: list of dicts, one per order and in the same order:
+                 {'id': order id,
+                  'success': True/False,
+                  'errors': list of error messages,
+                  'result': the Order node of the response (or None)}
+                 A batch rejected as a whole, or whose request failed (connection error,
+                 timeout, open circuit), marks each of its orders as failed, so only
+                 the failed orders need to be sent again. So does a response that does
+                 not confirm them: an empty body, or one that is not XML.
+
+        Usage::
+          >>> results = ngf_client.shipments.create_many(orders, batch_size=100)
+          >>> failed = [result for result in results if not result['success']]
+        """
+        if batch_size < 1:
+            raise exceptions.IncorrectParameterError("batch_size must be at least 1")
+
+        results = []
+        orders = iter(orders)
+        batch = list(islice(orders, batch_size))
+        while batch:
+            results.extend(self._create_batch(batch, params=params))
+            batch = list(islice(orders, batch_size))
+        return results
+
+    def _create_batch(self, orders: list, params: dict = None) -> list:
+        """
+        Posts one multi-order document and splits the response into per-order results
+        :param orders: list of Order dicts
+        :param params: Request parameters
+        :return: list of result dicts, see create_many()
+        """
+
+        order_ids = [serialize.order_id(order) for order in orders]
+        try:
+            response = self._post_batch(orders, params=params)
+        except (requests.RequestException, exceptions.NewgisticsException) as err:
+            # Fails this batch only, the results of the batches already posted are kept
+            return _failed_results(order_ids, str(err))
+        return self._batch_results(response, order_ids)
+
+    def _post_batch(
+        self, orders: list, params: dict = None, document: str = None
+    ) -> requests.Response:
+        """
+        Posts one multi-order document
+        :param orders: list of Order dicts
+        :param params: Request parameters
+        :param document: The orders already serialized with serialize.orders (Optional)
+        :return: requests.Response object, not processed
+        """
+
+        if document is None:
+            serializer = partial(serialize.orders, api_key=self.client.api_key)
+        else:
+
+            def serializer(payload):
+                return document
+
+        response = self._make_request(
+            "POST",
+            resource_endpoint="post_shipments.aspx",
+            dict_payload={"Orders": {"Order": orders}},
+            serializer=serializer,
+            query_params=params,
+            idempotent=not any(_allows_duplicate(order) for order in orders),
+        )
+        self._invalidate_shipments([serialize.order_id(order) for order in orders])
+        return response
+
+    def _batch_results(self, response: requests.Response, order_ids: list) -> list:
+        """
+        :param response: Response of _post_batch()
+        :param order_ids: Ids of the posted orders, in the posted order
+        :return: list of result dicts, see create_many()
+        """
+        try:
+            body = self.process(response).dict
+        except exceptions.NewgisticsException as err:
+            return _failed_results(order_ids, str(err))
+        except ExpatError as err:
+            # A 2xx body that is not XML, e.g. the error page of a proxy
+            return _failed_results(
+                order_ids, "Invalid response body: {err}".format(err=err)
+            )
+        return _order_results(body, order_ids)
+
+    def enqueue(self, payload: dict, params: dict = None) -> list:
+        """
+        Stores the Orders of a Shipment payload in the client's outbox and returns without
+        waiting for Newgistics. A background thread posts them in batches, see newgistics.outbox
+        :param payload: Request payload, as for create()
+        :param params: Request parameters
+        :return: list of the outbox ids of the Orders, to look them up with outbox.status()
+
+        Usage::
+          >>> ngf_client = NewgisticsFulfillment(outbox=Outbox('orders.sqlite3'))
+          >>> outbox_ids = ngf_client.shipments.enqueue(payload={'Orders': {'Order': order}})
+          >>> ngf_client.outbox.status(outbox_ids[0])
+          {'outbox_id': 1, 'id': '4321', 'status': 'pending', 'attempts': 0, ...}
+        """
+        outbox = self.client.outbox
+        if outbox is None:
+            raise exceptions.IncorrectParameterError(
+                "enqueue requires a client created with an outbox"
+            )
+        outbox_ids = outbox.put(_orders_of(payload), params=params)
+        outbox.start(self)
+        return outbox_ids
+
+
+def _orders_of(payload: dict) -> list:
+    """
+    :return: The Order(s) of a Shipment payload, as a list
+    """
+    orders = payload["Orders"]["Order"]
+    return orders if isinstance(orders, list) else [orders]
+
+
+def _allows_duplicate(order: dict) -> bool:
+    """
+    Newgistics rejects an order id it has seen before unless AllowDuplicate is set,
+    which makes posting such an order again safe
+    :param order: A single Order of a Shipment payload
+    :return: True if the order may be created twice
+    """
+    allow_duplicate = order.get("AllowDuplicate")
+    if isinstance(allow_duplicate, str):
+        return allow_duplicate.strip().lower() == "true"
+    return bool(allow_duplicate)
+
+
+def _unwrap(result: dict):
+    """
+    :return: The response of a pool.map_calls result, raising its error if any
+    """
+    if result["error"] is not None:
+        raise result["error"]
+    return result["response"]
+
+
+def _split_records(response: requests.Response, record_tag: str, ids: list) -> dict:
+    """
+    Splits a response holding the records of several ids into one response per id, each
+    with the root element of the original and the record_tag children whose id attribute
+    is that id (none when Newgistics returned nothing for it)
+    :return: {id: requests.Response object}
+    """
+    root = ElementTree.fromstring(response.content)
+    children = {record_id: [] for record_id in ids}
+    others = []
+    for child in root:
+        if child.tag == record_tag:
+            if child.get("id") in children:
+                children[child.get("id")].append(child)
+        else:
+            others.append(child)
+
+    responses = {}
+    for record_id, records in children.items():
+        split_root = ElementTree.Element(root.tag, root.attrib)
+        split_root.text = root.text
+        split_root.extend(others + records)
+        split = copy.copy(response)
+        split._content = ElementTree.tostring(split_root, encoding="unicode").encode(
+            "utf-8"
+        )
+        split.headers = requests.structures.CaseInsensitiveDict(response.headers)
+        split.headers["Content-Length"] = str(len(split._content))
+        responses[record_id] = split
+    return responses
+
+
+def _record_key(record):
+    """
+    :return: Identity of a streamed record, used to drop duplicates
+    """
+    if isinstance(record, dict) and record.get("@id") is not None:
+        return record["@id"]
+    return repr(record)
+
+
+def _find(node, name: str):
+    """
+    Case insensitive lookup of a key in a node parsed by xmltodict
+    """
+    if not isinstance(node, dict):
+        return None
+    name = name.lower()
+    for key, value in node.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _text(value) -> str:
+    if isinstance(value, dict):
+        return value.get("#text") or ""
+    return value or ""
+
+
+def _node_errors(node) -> list:
+    """
+    :return: Error messages found under the Errors/Error element(s) of a node
+    """
+    errors = _find(node, "Errors")
+    if isinstance(errors, dict):
+        errors = _find(errors, "Error")
+    return [_text(error) for error in _as_list(errors) if _text(error)]
+
+
+def _node_success(node, default: bool = True) -> bool:
+    success = _find(node, "@success")
+    if success is None:
+        success = _find(node, "Success")
+    if success is None:
+        return default
+    return _text(success).strip().lower() == "true"
+
+
+def _failed_results(order_ids: list, error: str) -> list:
+    """
+    :return: list of result dicts, see Shipment.create_many(), failing every order with error
+    """
+    return [
+        {"id": order_id, "success": False, "errors": [error], "result": None}
+        for order_id in order_ids
+    ]
+
+
+def _order_results(body, order_ids: list) -> list:
+    """
+    Splits the response of a multi-order post_shipments.aspx call into per-order results
+    :param body: Response body parsed by xmltodict
+    :param order_ids: Ids of the posted orders, in the posted order
+    :return: list of result dicts, see Shipment.create_many()
+    """
+
+    root = next(iter(body.values()), None) if isinstance(body, dict) else None
+    batch_errors = _node_errors(root)
+    batch_success = _node_success(root, default=None)
+    if batch_success is None:
+        # An empty or unrecognized body confirms nothing about the orders it lacks
+        batch_success = False
+        batch_errors = batch_errors or [UNCONFIRMED]
+
+    orders = _find(root, "Orders")
+    if isinstance(orders, dict):
+        orders = _find(orders, "Order")
+    else:
+        orders = _find(root, "Order")
+    by_id = {}
+    for node in _as_list(orders):
+        node_id = _find(node, "@id") or _find(node, "@orderID")
+        if node_id is not None:
+            by_id[node_id] = node
+
+    results = []
+    for order_id in order_ids:
+        node = by_id.get(order_id)
+        if node is None:
+            results.append(
+                {
+                    "id": order_id,
+                    "success": batch_success,
+                    "errors": batch_errors,
+                    "result": None,
+                }
+            )
+            continue
+        errors = _node_errors(node)
+        results.append(
+            {
+                "id": order_id,
+                "success": _node_success(node, default=not errors),
+                "errors": errors,
+                "result": node,
+            }
+        )
+    return results
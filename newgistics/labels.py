@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.labels
+~~~~~~~~~~~~~~~~~
+
+Streams the base64 label data of a ShipmentLabel response to files or writables,
+decoding it as it comes off the socket instead of parsing the whole document, and
+checkpoints bulk label runs.
+"""
+
+import binascii
+import json
+import os
+import threading
+from xml.parsers import expat
+
+from . import exceptions
+
+# Tags of the elements whose text is base64 label data
+LABEL_TAGS = ("Label", "LabelData", "LabelImage", "Image")
+
+# (leading bytes, file extension, content type) used to name the written files
+_SIGNATURES = (
+    (b"%PDF", ".pdf", "application/pdf"),
+    (b"\x89PNG", ".png", "image/png"),
+    (b"\xff\xd8\xff", ".jpg", "image/jpeg"),
+    (b"GIF8", ".gif", "image/gif"),
+    (b"^XA", ".zpl", "application/zpl"),
+)
+
+_WHITESPACE = b" \t\r\n"
+
+
+def sniff(head: bytes):
+    """
+    :param head: First decoded bytes of a label
+    :return: (file extension, content type) tuple
+    """
+    for signature, extension, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return extension, content_type
+    return ".bin", "application/octet-stream"
+
+
+class Label(object):
+    """
+    Where one label of the response was written
+    """
+
+    __slots__ = ("index", "tag", "path", "offset", "size", "content_type")
+
+    def __init__(self, index: int, tag: str, path=None, offset: int = 0):
+        self.index = index
+        self.tag = tag
+        self.path = path
+        self.offset = offset
+        self.size = 0
+        self.content_type = None
+
+    def __repr__(self) -> str:
+        return "<Label {index} {content_type} {size} bytes>".format(
+            index=self.index, content_type=self.content_type, size=self.size
+        )
+
+
+class LabelResult(object):
+    """
+    What is left of a streamed label response once the labels are written:
+    labels, one newgistics.labels.Label per label element, and fields, the text of every
+    other leaf element by tag name (TrackingNumber, Success, ...).
+    """
+
+    __slots__ = ("labels", "fields", "status_code")
+
+    def __init__(self, status_code: int):
+        self.labels = []
+        self.fields = {}
+        self.status_code = status_code
+
+    def __repr__(self) -> str:
+        return "<LabelResult [{status}] {count} labels>".format(
+            status=self.status_code, count=len(self.labels)
+        )
+
+
+def prepare_destination(destination):
+    """
+    Creates destination if it is a directory path that does not exist yet, so a label is
+    never received with nowhere to write it
+    :param destination: Destination as for write_labels()
+    """
+    if isinstance(destination, (str, os.PathLike)):
+        os.makedirs(destination, exist_ok=True)
+
+
+class _Sink(object):
+    """
+    Opens the destination of each label and writes its decoded bytes
+    """
+
+    def __init__(self, destination, prefix: str):
+        self.destination = destination
+        self.prefix = prefix
+        self.offset = 0
+        self.target = None
+        self.opened = None
+        if isinstance(destination, (bytearray, memoryview)):
+            self.target = memoryview(destination).cast("B")
+        prepare_destination(destination)
+
+    def open(self, label: Label, head: bytes):
+        label.content_type = sniff(head)[1]
+        destination = self.destination
+        label.offset = self.offset
+        if isinstance(destination, (str, os.PathLike)):
+            label.path = os.path.join(
+                destination,
+                "{prefix}{index}{extension}".format(
+                    prefix=self.prefix, index=label.index, extension=sniff(head)[0]
+                ),
+            )
+            self.opened = open(label.path, "wb")
+        elif callable(destination) and not hasattr(destination, "write"):
+            self.opened = None
+            self.target = destination(label)
+
+    def write(self, label: Label, data: bytes):
+        if self.opened is not None:
+            self.opened.write(data)
+        elif isinstance(self.target, memoryview):
+            end = self.offset + len(data)
+            if end > len(self.target):
+                raise exceptions.NewgisticsException(
+                    "Label data does not fit in the {size} bytes buffer".format(
+                        size=len(self.target)
+                    )
+                )
+            self.target[self.offset : end] = data
+        elif self.target is not None:
+            self.target.write(data)
+        else:
+            self.destination.write(data)
+        label.size += len(data)
+        self.offset += len(data)
+
+    def close(self):
+        if self.opened is not None:
+            self.opened.close()
+            self.opened = None
+
+
+def write_labels(
+    chunks,
+    destination,
+    status_code: int = 200,
+    label_tags=LABEL_TAGS,
+    prefix: str = "label-",
+) -> LabelResult:
+    """
+    Incrementally parses a label response, decoding the base64 text of the label_tags
+    elements into destination. At most one chunk of the body is held in memory.
+    :param chunks: Iterable of bytes, e.g. requests.Response.iter_content()
+    :param destination: Where the decoded labels go:
+                        a directory path: one file per label, named prefix + index + the
+                            extension sniffed from the data (.pdf, .png, .zpl, ...), the
+                            directory being created if missing
+                        a callable: called with each newgistics.labels.Label, returns the
+                            binary writable of that label (left open)
+                        a bytearray/memoryview or binary writable (file, socket, ...):
+                            every label written back to back, see Label.offset and size
+    :param status_code: HTTP status of the response, kept on the result
+    :param label_tags: Tags of the elements holding label data
+    :param prefix: Prefix of the file names when destination is a directory
+    :return: newgistics.labels.LabelResult object
+    """
+
+    result = LabelResult(status_code)
+    sink = _Sink(destination, prefix)
+    label_tags = frozenset(label_tags)
+    state = {"label": None, "pending": b"", "head": b"", "text": []}
+
+    def flush_head():
+        # Opens the label's destination once its type can be told from the first bytes
+        label = state["label"]
+        sink.open(label, state["head"])
+        data, state["head"] = state["head"], None
+        if data:
+            sink.write(label, data)
+
+    def decode(data: bytes):
+        label = state["label"]
+        if state["head"] is not None:
+            state["head"] += data
+            if len(state["head"]) >= 4:
+                flush_head()
+        elif data:
+            sink.write(label, data)
+
+    def start(tag, attributes):
+        state["text"] = []
+        if tag in label_tags:
+            state["label"] = Label(len(result.labels), tag)
+            state["pending"] = b""
+            state["head"] = b""
+
+    def end(tag):
+        label = state["label"]
+        if label is not None and tag == label.tag:
+            if state["head"] is not None and state["head"]:
+                flush_head()
+            if state["head"] is None:
+                result.labels.append(label)
+            state["label"] = None
+            sink.close()
+        elif state["text"]:
+            text = "".join(state["text"]).strip()
+            if text:
+                result.fields[tag] = text
+        state["text"] = []
+
+    def character_data(text):
+        if state["label"] is None:
+            state["text"].append(text)
+            return
+        try:
+            data = state["pending"] + text.encode("ascii").translate(None, _WHITESPACE)
+            usable = len(data) - len(data) % 4
+            state["pending"] = data[usable:]
+            if usable:
+                decode(binascii.a2b_base64(data[:usable]))
+        except (UnicodeEncodeError, binascii.Error) as err:
+            raise exceptions.InvalidFormat(
+                "Label {index} is not valid base64: {err}".format(
+                    index=state["label"].index, err=err
+                )
+            )
+
+    parser = expat.ParserCreate()
+    parser.buffer_text = False
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = character_data
+    try:
+        for chunk in chunks:
+            if chunk:
+                parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+    except expat.ExpatError as err:
+        raise exceptions.InvalidFormat(
+            "Malformed label response: {err}".format(err=err)
+        )
+    finally:
+        sink.close()
+    return result
+
+
+class Checkpoint(object):
+    """
+    Append-only file of the items a ShipmentLabel.create_many run has completed, one JSON
+    line each, so a run that crashed can be started again without creating them twice.
+    Lines are flushed as they are written: they survive a crash of the process, not of
+    the machine. A torn last line is ignored.
+
+    Usage::
+      >>> checkpoint = Checkpoint('recall-2019-04.jsonl')
+      >>> results = ngweb_client.labels.create_many(payloads, checkpoint=checkpoint,
+      ...                                           key=lambda payload: payload['returnId'])
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: File of the checkpoint, created if missing
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as checkpoint_file:
+                for line in checkpoint_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._done[str(entry["key"])] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, key) -> bool:
+        return str(key) in self._done
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def get(self, key):
+        """
+        :return: dict recorded for key, or None if it was not completed
+        """
+        return self._done.get(str(key))
+
+    def record(self, key, **fields):
+        """
+        Marks key as completed
+        :param key: Key of the item
+        :param fields: JSON serializable details kept with it, e.g. status=200
+        """
+        entry = dict(fields, key=key)
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._done[str(key)] = entry
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
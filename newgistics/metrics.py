@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.metrics
+~~~~~~~~~~~~~~~~~~
+
+Request instrumentation: per-phase timings reported to hooks, an in-memory aggregator
+and a Prometheus text exporter.
+"""
+
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from . import exceptions
+
+# Phases a request's time is split into, in order
+PHASES = ("serialize", "connect", "server", "download", "parse")
+
+# Upper bounds in seconds of the histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class RequestEvent(object):
+    """
+    What happened during one request, reported to the client's hooks.
+    kind is "request" once the response headers (or a transport error) are in, and
+    "parse" when the XML body is parsed later on, with only the parse timing set.
+    timings maps the phases that were measured to seconds:
+        serialize: payload to XML/JSON
+        connect: DNS lookup, TCP and TLS handshakes, absent when a pooled connection was reused
+        server: request sent until the response headers were read
+        download: reading the body, absent for streamed responses
+        parse: XML body to dict
+    """
+
+    __slots__ = (
+        "kind",
+        "method",
+        "endpoint",
+        "status",
+        "bytes_out",
+        "bytes_in",
+        "attempts",
+        "error",
+        "timings",
+        "_hooks",
+    )
+
+    def __init__(self, method: str, endpoint: str, hooks, kind: str = "request"):
+        self.kind = kind
+        self.method = method
+        self.endpoint = endpoint
+        self.status = None
+        self.bytes_out = 0
+        self.bytes_in = None
+        self.attempts = 0
+        self.error = None
+        self.timings = {}
+        self._hooks = hooks
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+    def emit(self):
+        for hook in self._hooks:
+            hook(self)
+
+    def parsed(self, seconds: float):
+        """
+        Reports the parse time of the response body as a "parse" event
+        :param seconds: Time spent parsing
+        """
+        event = RequestEvent(self.method, self.endpoint, self._hooks, kind="parse")
+        event.status = self.status
+        event.timings["parse"] = seconds
+        event.emit()
+
+    def __repr__(self) -> str:
+        return "<RequestEvent {kind} {method} {endpoint} [{status}]>".format(
+            kind=self.kind,
+            method=self.method,
+            endpoint=self.endpoint,
+            status=self.status,
+        )
+
+
+class RequestTimer(object):
+    """
+    Fills a RequestEvent while _make_request runs
+    """
+
+    def __init__(self, method: str, endpoint: str, hooks):
+        self.event = RequestEvent(method, endpoint, hooks)
+
+    def serialize(self, serializer, payload):
+        """
+        :return: serializer(payload), timed as the serialize phase
+        """
+        started = time.perf_counter()
+        try:
+            return serializer(payload)
+        finally:
+            self.event.timings["serialize"] = time.perf_counter() - started
+
+    def send(self, send, session, url: str):
+        """
+        Calls send() for one attempt, timing the connect, server and download phases
+        :param send: Callable sending the request
+        :param session: requests.Session the request goes through
+        :param url: URL of the request
+        :return: requests.Response object
+        """
+        instrument_adapter(session.get_adapter(url))
+        event = self.event
+        event.attempts += 1
+        _connect_time.seconds = 0.0
+        started = time.perf_counter()
+        try:
+            response = send()
+        except Exception as err:
+            event.error = type(err).__name__
+            raise
+        finally:
+            total = time.perf_counter() - started
+            connect = _connect_time.seconds
+            if connect:
+                event.timings["connect"] = event.timings.get("connect", 0.0) + connect
+
+        event.error = None
+        event.status = response.status_code
+        headers_in = response.elapsed.total_seconds()
+        event.timings["server"] = max(0.0, headers_in - connect)
+        if response._content_consumed:
+            event.timings["download"] = max(0.0, total - headers_in)
+            event.bytes_in = len(response.content)
+        elif response.headers.get("Content-Length", "").isdigit():
+            event.bytes_in = int(response.headers["Content-Length"])
+        event.bytes_out = _body_size(response.request.body)
+        return response
+
+    def done(self, response=None):
+        """
+        Emits the event, naming the exception process() raises for the response's status
+        """
+        event = self.event
+        if response is not None:
+            exception_class = exceptions.exception_class(response.status_code)
+            if exception_class is not None:
+                event.error = exception_class.__name__
+            response.newgistics_event = event
+        event.emit()
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    try:
+        return len(body)
+    except TypeError:
+        return 0
+
+
+# Seconds spent in connect() by the current thread since its request started
+_connect_time = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super(_TimedHTTPConnection, self).connect()
+        finally:
+            _connect_time.seconds = getattr(_connect_time, "seconds", 0.0) + (
+                time.perf_counter() - started
+            )
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super(_TimedHTTPSConnection, self).connect()
+        finally:
+            _connect_time.seconds = getattr(_connect_time, "seconds", 0.0) + (
+                time.perf_counter() - started
+            )
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+_TIMED_POOLS = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+def instrument_adapter(adapter):
+    """
+    Makes the connection pools of adapter time their connect() calls
+    :param adapter: requests.adapters.HTTPAdapter object
+    """
+    if not isinstance(adapter, HTTPAdapter):
+        return
+    poolmanager = adapter.poolmanager
+    if poolmanager.pool_classes_by_scheme is not _TIMED_POOLS:
+        poolmanager.pool_classes_by_scheme = _TIMED_POOLS
+
+
+class Histogram(object):
+    """
+    Cumulative histogram with fixed buckets, Prometheus style
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsAggregator(object):
+    """
+    Hook aggregating the events of one or more clients in memory:
+    a histogram per endpoint and phase, and counters of requests per status, errors per
+    exception class, retries and bytes per endpoint.
+
+    Usage::
+      >>> aggregator = MetricsAggregator()
+      >>> ngf_client = NewgisticsFulfillment(api_key='API-KEY', hooks=[aggregator])
+      >>> print(to_prometheus(aggregator))
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: Upper bounds in seconds of the histogram buckets
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.requests = {}
+        self.errors = {}
+        self.retries = {}
+        self.bytes = {}
+
+    def __call__(self, event: RequestEvent):
+        with self._lock:
+            for phase, seconds in event.timings.items():
+                key = (event.endpoint, phase)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(self.buckets)
+                histogram.observe(seconds)
+            if event.kind != "request":
+                return
+            key = (event.endpoint, str(event.status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if event.error:
+                key = (event.endpoint, event.error)
+                self.errors[key] = self.errors.get(key, 0) + 1
+            self.retries[event.endpoint] = (
+                self.retries.get(event.endpoint, 0) + event.retries
+            )
+            for direction, size in (("out", event.bytes_out), ("in", event.bytes_in)):
+                if size:
+                    key = (event.endpoint, direction)
+                    self.bytes[key] = self.bytes.get(key, 0) + size
+
+
+def _labels(**labels) -> str:
+    return ",".join(
+        '{name}="{value}"'.format(
+            name=name,
+            value=str(value)
+            .replace("\\", "\\\\")
+            .replace("\n", "\\n")
+            .replace('"', '\\"'),
+        )
+        for name, value in labels.items()
+    )
+
+
+def to_prometheus(aggregator: MetricsAggregator, prefix: str = "newgistics") -> str:
+    """
+    Renders the aggregated metrics in the Prometheus text exposition format
+    :param aggregator: MetricsAggregator object
+    :param prefix: Prefix of the metric names
+    :return: str
+    """
+
+    lines = []
+    with aggregator._lock:
+        name = prefix + "_request_phase_seconds"
+        lines.append("# HELP {name} Time spent per request phase".format(name=name))
+        lines.append("# TYPE {name} histogram".format(name=name))
+        for (endpoint, phase), histogram in sorted(aggregator.histograms.items()):
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(
+                    "{name}_bucket{{{labels}}} {count}".format(
+                        name=name,
+                        labels=_labels(endpoint=endpoint, phase=phase, le=bound),
+                        count=count,
+                    )
+                )
+            lines.append(
+                "{name}_bucket{{{labels}}} {count}".format(
+                    name=name,
+                    labels=_labels(endpoint=endpoint, phase=phase, le="+Inf"),
+                    count=histogram.count,
+                )
+            )
+            labels = _labels(endpoint=endpoint, phase=phase)
+            lines.append(
+                "{name}_sum{{{labels}}} {value}".format(
+                    name=name, labels=labels, value=histogram.sum
+                )
+            )
+            lines.append(
+                "{name}_count{{{labels}}} {value}".format(
+                    name=name, labels=labels, value=histogram.count
+                )
+            )
+
+        counters = (
+            ("requests_total", "Requests per status", aggregator.requests, "status"),
+            ("errors_total", "Errors per exception class", aggregator.errors, "error"),
+            ("bytes_total", "Bytes sent and received", aggregator.bytes, "direction"),
+        )
+        for suffix, help_text, values, label in counters:
+            name = "{prefix}_{suffix}".format(prefix=prefix, suffix=suffix)
+            lines.append("# HELP {name} {help}".format(name=name, help=help_text))
+            lines.append("# TYPE {name} counter".format(name=name))
+            for (endpoint, value), count in sorted(values.items()):
+                lines.append(
+                    "{name}{{{labels}}} {count}".format(
+                        name=name,
+                        labels=_labels(**{"endpoint": endpoint, label: value}),
+                        count=count,
+                    )
+                )
+
+        name = prefix + "_retries_total"
+        lines.append("# HELP {name} Retried attempts".format(name=name))
+        lines.append("# TYPE {name} counter".format(name=name))
+        for endpoint, count in sorted(aggregator.retries.items()):
+            lines.append(
+                "{name}{{{labels}}} {count}".format(
+                    name=name, labels=_labels(endpoint=endpoint), count=count
+                )
+            )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.models
+~~~~~~~~~~~~~~~~~
+
+Lightweight __slots__ record classes for Shipments, Orders, Returns and their Items,
+built straight from the XML elements of a (streamed) response.
+"""
+
+from xml.etree import ElementTree
+
+from . import streaming
+
+
+class Record(object):
+    """
+    Parent class of all the records.
+    Fields are matched with XML attributes and child elements case insensitively, ignoring
+    the underscores of the field name (order_date <- OrderDate), plus the names in _aliases.
+    Nested records are built for the fields of _nested, and a list of them when the XML has a
+    container element (Items/Item). Anything else is kept, as xmltodict would parse it, in the
+    extra dict, which stays None when every attribute and child element is known.
+    """
+
+    __slots__ = ("extra",)
+
+    # Tag name of the record's XML element
+    tag = None
+    # Fields of the record, in order
+    _fields = ()
+    # {lowercased XML name: field}, for the names that do not follow the naming rule
+    _aliases = {}
+    # {field: (Record class, True for a list)}
+    _nested = {}
+    # {field: callable converting the XML text}
+    _types = {}
+    # {lowercased XML name: field}, built once per class by _lookup()
+    _names = None
+
+    def __init__(self, **fields):
+        for name in self._fields:
+            setattr(self, name, fields.pop(name, None))
+        self.extra = fields.pop("extra", None)
+        if fields:
+            raise TypeError(
+                "{cls} got unexpected fields: {names}".format(
+                    cls=type(self).__name__, names=", ".join(sorted(fields))
+                )
+            )
+
+    @classmethod
+    def _lookup(cls) -> dict:
+        if cls.__dict__.get("_names") is None:
+            names = {field.replace("_", ""): field for field in cls._fields}
+            names.update(cls._aliases)
+            cls._names = names
+        return cls._names
+
+    @classmethod
+    def from_element(cls, element: ElementTree.Element):
+        """
+        :param element: xml.etree.ElementTree.Element of the record
+        :return: Record object
+        """
+
+        names = cls._lookup()
+        fields = {}
+        extra = None
+        for key, value in element.attrib.items():
+            field = names.get(key.lower())
+            if field is None or field in cls._nested:
+                extra = extra or {}
+                extra["@" + key] = value
+                continue
+            fields[field] = cls._convert(field, value)
+        for child in element:
+            field = names.get(child.tag.lower())
+            if field is None:
+                extra = extra or {}
+                extra[child.tag] = streaming.element_to_dict(child)
+            elif field in cls._nested:
+                model, many = cls._nested[field]
+                if many:
+                    fields[field] = [model.from_element(item) for item in child]
+                else:
+                    fields[field] = model.from_element(child)
+            else:
+                fields[field] = cls._convert(field, (child.text or "").strip() or None)
+        fields["extra"] = extra
+        return cls(**fields)
+
+    @classmethod
+    def _convert(cls, field: str, value):
+        convert = cls._types.get(field)
+        if convert is None or value is None:
+            return value
+        try:
+            return convert(value)
+        except ValueError:
+            return value
+
+    def to_dict(self) -> dict:
+        """
+        :return: dict of the fields, nested records included, extra left out
+        """
+        result = {}
+        for name in self._fields:
+            value = getattr(self, name)
+            if isinstance(value, Record):
+                value = value.to_dict()
+            elif isinstance(value, list):
+                value = [
+                    item.to_dict() if isinstance(item, Record) else item
+                    for item in value
+                ]
+            result[name] = value
+        return result
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name)
+            for name in self._fields + ("extra",)
+        )
+
+    def __repr__(self) -> str:
+        return "<{cls} {fields}>".format(
+            cls=type(self).__name__,
+            fields=" ".join(
+                "{name}={value!r}".format(name=name, value=getattr(self, name))
+                for name in self._fields[:2]
+            ),
+        )
+
+
+def _to_bool(value: str) -> bool:
+    if value.strip().lower() in ("true", "1", "yes"):
+        return True
+    if value.strip().lower() in ("false", "0", "no"):
+        return False
+    raise ValueError(value)
+
+
+class Item(Record):
+    __slots__ = ("id", "sku", "qty", "reason", "description")
+
+    tag = "Item"
+    _fields = __slots__
+    _types = {"qty": int}
+
+
+class Customer(Record):
+    __slots__ = (
+        "first_name",
+        "last_name",
+        "company",
+        "address1",
+        "address2",
+        "city",
+        "state",
+        "zip",
+        "country",
+        "email",
+        "phone",
+        "is_residential",
+    )
+
+    tag = "CustomerInfo"
+    _fields = __slots__
+    _aliases = {"postalcode": "zip"}
+    _types = {"is_residential": _to_bool}
+
+
+class Order(Record):
+    __slots__ = (
+        "id",
+        "order_date",
+        "customer",
+        "items",
+        "allow_duplicate",
+        "hold_for_all_inventory",
+        "requires_signature",
+    )
+
+    tag = "Order"
+    _fields = __slots__
+    _aliases = {"customerinfo": "customer"}
+    _nested = {"customer": (Customer, False), "items": (Item, True)}
+    _types = {
+        "allow_duplicate": _to_bool,
+        "hold_for_all_inventory": _to_bool,
+        "requires_signature": _to_bool,
+    }
+
+
+class Shipment(Record):
+    __slots__ = (
+        "id",
+        "order_id",
+        "status",
+        "ship_method",
+        "ship_date",
+        "tracking",
+        "warehouse",
+        "customer",
+        "items",
+    )
+
+    tag = "Shipment"
+    _fields = __slots__
+    _aliases = {
+        "customerinfo": "customer",
+        "shipmentstatus": "status",
+        "shippeddate": "ship_date",
+        "trackingnumber": "tracking",
+    }
+    _nested = {"customer": (Customer, False), "items": (Item, True)}
+
+
+class Return(Record):
+    __slots__ = (
+        "id",
+        "order_id",
+        "rma",
+        "status",
+        "received_timestamp",
+        "comments",
+        "items",
+    )
+
+    tag = "Return"
+    _fields = __slots__
+    _nested = {"items": (Item, True)}
+
+
+def iter_models(chunks, model):
+    """
+    Incrementally parses an XML document and yields its records as model objects
+    :param chunks: Iterable of bytes, e.g. requests.Response.iter_content()
+    :param model: Record class, e.g. newgistics.models.Shipment
+    :return: Generator of model objects
+    """
+
+    for element in streaming.iter_elements(chunks, tag=model.tag):
+        yield model.from_element(element)
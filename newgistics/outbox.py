@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.outbox
+~~~~~~~~~~~~~~~~~
+
+Durable outbox for Shipment creation: Orders are written to a local SQLite database and
+posted to Newgistics in batches by a background thread, which records the outcome of
+every Order.
+"""
+
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+
+from . import exceptions, serialize
+
+logger = logging.getLogger(__name__)
+
+# States of an outboxed Order
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    outbox_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT,
+    payload TEXT NOT NULL,
+    params TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    claimed_at REAL,
+    errors TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+"""
+
+_COLUMNS = (
+    "outbox_id",
+    "order_id",
+    "status",
+    "attempts",
+    "next_attempt",
+    "errors",
+    "result",
+    "created_at",
+    "updated_at",
+)
+
+
+class Outbox(object):
+    """
+    Queue of Orders to create, persisted in a SQLite database so they survive restarts
+    and Newgistics outages.
+
+    put() commits the Orders and returns. flush() (or the worker thread started by
+    start()) posts the due Orders batch_size at a time through Shipment.create_many's
+    request path, and records per Order:
+        sent: Newgistics accepted it, result holds its node of the response
+        failed: Newgistics rejected it, or max_attempts attempts failed, errors says why
+    Batches failing as a whole on a transport error or a retryable status
+    (RetryPolicy.statuses) are put back with exponential backoff.
+
+    Delivery is at least once: an Order may be posted again if the process dies between
+    the request and the recording of its outcome. Newgistics rejects a repeated order id
+    unless AllowDuplicate is set.
+
+    Usage::
+      >>> outbox = Outbox('/var/lib/myapp/newgistics-outbox.sqlite3')
+      >>> ngf_client = NewgisticsFulfillment(api_key='API-KEY', outbox=outbox)
+      >>> ngf_client.shipments.enqueue(payload={'Orders': {'Order': order}})
+      [1]
+      >>> outbox.counts
+      {'pending': 1, 'sending': 0, 'sent': 0, 'failed': 0}
+    """
+
+    PENDING = PENDING
+    SENDING = SENDING
+    SENT = SENT
+    FAILED = FAILED
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_attempts: int = 10,
+        backoff_factor: float = 2.0,
+        max_backoff: float = 300.0,
+        lease: float = 300.0,
+        durable: bool = True,
+        clock=time.time,
+    ):
+        """
+        :param path: SQLite database file, created if missing
+        :param batch_size: Maximum number of Orders posted in a single request
+        :param flush_interval: Seconds the worker waits between flushes, unless batch_size
+                               Orders were put in the meantime
+        :param max_attempts: Attempts made per Order before it is marked failed
+        :param backoff_factor: Base of the exponential backoff between attempts in seconds
+        :param max_backoff: Upper bound of a single wait in seconds
+        :param lease: Seconds after which an Order claimed by a flush that never recorded
+                      its outcome (crashed process) is sent again
+        :param durable: fsync every commit (synchronous=FULL) if True, else only survive
+                        process crashes, not power losses (synchronous=NORMAL)
+        :param clock: Function returning the current time in seconds, time.time by default
+        """
+        if batch_size < 1:
+            raise exceptions.IncorrectParameterError("batch_size must be at least 1")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "PRAGMA synchronous={mode}".format(mode="FULL" if durable else "NORMAL")
+        )
+        self._connection.executescript(_SCHEMA)
+        self._put_since_flush = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+
+    def put(self, orders, params: dict = None) -> list:
+        """
+        Stores Orders, committed before returning
+        :param orders: Iterable of Order dicts, each shaped like payload['Orders']['Order']
+                       of Shipment.create()
+        :param params: Request parameters to post them with
+        :return: list of the outbox ids of the Orders
+        """
+
+        now = self.clock()
+        params_json = _dumps(params) if params else None
+        rows = [
+            (
+                serialize.order_id(order),
+                _dumps(order),
+                params_json,
+                PENDING,
+                now,
+                now,
+                now,
+            )
+            for order in orders
+        ]
+        with self._lock, self._transaction() as cursor:
+            outbox_ids = []
+            for row in rows:
+                cursor.execute(
+                    "INSERT INTO outbox (order_id, payload, params, status, next_attempt,"
+                    " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                outbox_ids.append(cursor.lastrowid)
+            self._put_since_flush += len(rows)
+            if self._put_since_flush >= self.batch_size:
+                self._wakeup.set()
+        return outbox_ids
+
+    def flush(self, shipments) -> int:
+        """
+        Posts every due Order, batch_size at a time
+        :param shipments: newgistics.fulfillments.Shipment of the client to post with
+        :return: Number of Orders whose attempt was recorded
+        """
+
+        self._put_since_flush = 0
+        # Orders put back during this flush wait for the next one
+        started = self.clock()
+        handled = 0
+        while not self._stopping.is_set():
+            claimed = self._claim(started)
+            if not claimed:
+                break
+            batches = {}
+            for row in claimed:
+                batches.setdefault(row[2], []).append(row)
+            for params_json, rows in batches.items():
+                self._post(shipments, rows, json.loads(params_json or "null"))
+            handled += len(claimed)
+        return handled
+
+    def _post(self, shipments, rows: list, params: dict):
+        outbox_ids = [row[0] for row in rows]
+        orders = [json.loads(row[1]) for row in rows]
+        try:
+            response = shipments._post_batch(orders, params=params)
+        except (exceptions.CircuitOpenError, exceptions.LoadShedError) as err:
+            # Failed fast without being sent, the attempt is not counted
+            return self._retry_later(
+                rows,
+                "{name}: {err}".format(name=type(err).__name__, err=err),
+                attempted=False,
+            )
+        except requests.RequestException as err:
+            return self._retry_later(
+                rows, "{name}: {err}".format(name=type(err).__name__, err=err)
+            )
+        if response.status_code in shipments.client.retry_policy.statuses:
+            return self._retry_later(
+                rows, "HTTP {status}".format(status=response.status_code)
+            )
+        try:
+            results = shipments._batch_results(
+                response, [serialize.order_id(order) for order in orders]
+            )
+        except Exception as err:
+            # Not left claimed until the lease expires: counted as a failed attempt
+            return self._retry_later(
+                rows, "{name}: {err}".format(name=type(err).__name__, err=err)
+            )
+        self._record(outbox_ids, results)
+
+    def _claim(self, due: float) -> list:
+        """
+        Marks up to batch_size due Orders as being sent. Orders whose lease expired are
+        claimed again, or failed if out of attempts
+        :param due: Time the Orders must be due by
+        :return: list of (outbox_id, payload, params) tuples
+        """
+        now = self.clock()
+        with self._lock, self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE outbox SET status = ?, errors = ?, claimed_at = NULL,"
+                " updated_at = ? WHERE status = ? AND claimed_at <= ? AND attempts >= ?",
+                (
+                    FAILED,
+                    _dumps(["Lease expired without an outcome, out of attempts"]),
+                    now,
+                    SENDING,
+                    due - self.lease,
+                    self.max_attempts,
+                ),
+            )
+            rows = cursor.execute(
+                "SELECT outbox_id, payload, params FROM outbox"
+                " WHERE (status = ? AND next_attempt <= ?)"
+                " OR (status = ? AND claimed_at <= ?)"
+                " ORDER BY outbox_id LIMIT ?",
+                (PENDING, due, SENDING, due - self.lease, self.batch_size),
+            ).fetchall()
+            cursor.executemany(
+                "UPDATE outbox SET status = ?, claimed_at = ?, attempts = attempts + 1,"
+                " updated_at = ? WHERE outbox_id = ?",
+                [(SENDING, now, now, row[0]) for row in rows],
+            )
+        return rows
+
+    def _record(self, outbox_ids: list, results: list):
+        now = self.clock()
+        with self._lock, self._transaction() as cursor:
+            cursor.executemany(
+                "UPDATE outbox SET status = ?, errors = ?, result = ?, claimed_at = NULL,"
+                " updated_at = ? WHERE outbox_id = ?",
+                [
+                    (
+                        SENT if result["success"] else FAILED,
+                        _dumps(result["errors"]) if result["errors"] else None,
+                        _dumps(result["result"]) if result["result"] else None,
+                        now,
+                        outbox_id,
+                    )
+                    for outbox_id, result in zip(outbox_ids, results)
+                ],
+            )
+
+    def _retry_later(self, rows: list, error: str, attempted: bool = True):
+        """
+        Puts claimed Orders back, failing those out of attempts
+        :param attempted: False when the request was not sent, e.g. an open circuit:
+                          the attempt counted by _claim() is given back
+        """
+        now = self.clock()
+        errors = _dumps([error])
+        with self._lock, self._transaction() as cursor:
+            for row in rows:
+                attempts = cursor.execute(
+                    "SELECT attempts FROM outbox WHERE outbox_id = ?", (row[0],)
+                ).fetchone()[0]
+                if not attempted:
+                    attempts -= 1
+                status = FAILED if attempts >= self.max_attempts else PENDING
+                cursor.execute(
+                    "UPDATE outbox SET status = ?, errors = ?, next_attempt = ?,"
+                    " attempts = ?, claimed_at = NULL, updated_at = ?"
+                    " WHERE outbox_id = ?",
+                    (
+                        status,
+                        errors,
+                        now + self.backoff(max(attempts, 1)),
+                        attempts,
+                        now,
+                        row[0],
+                    ),
+                )
+
+    def backoff(self, attempt: int) -> float:
+        """
+        :return: Seconds to wait after the attempt-th failed attempt, with full jitter
+        """
+        ceiling = min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def status(self, outbox_id: int) -> dict:
+        """
+        :param outbox_id: Id returned by put() or Shipment.enqueue()
+        :return: dict {'outbox_id', 'id' (the order id), 'status', 'attempts', 'next_attempt',
+                 'errors', 'result', 'created_at', 'updated_at'} or None if unknown
+        """
+        rows = self._select("WHERE outbox_id = ?", (outbox_id,))
+        return rows[0] if rows else None
+
+    def results(self, status: str = None, order_id: str = None) -> list:
+        """
+        :param status: Only the Orders in this state, e.g. Outbox.FAILED (Optional)
+        :param order_id: Only the Orders with this order id (Optional)
+        :return: list of dicts, see status(), oldest first
+        """
+        conditions = []
+        values = []
+        if status is not None:
+            conditions.append("status = ?")
+            values.append(status)
+        if order_id is not None:
+            conditions.append("order_id = ?")
+            values.append(order_id)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return self._select(where, tuple(values))
+
+    @property
+    def counts(self) -> dict:
+        """
+        :return: dict with the number of Orders in each state
+        """
+        counts = {PENDING: 0, SENDING: 0, SENT: 0, FAILED: 0}
+        with self._lock:
+            for status, count in self._connection.execute(
+                "SELECT status, COUNT(*) FROM outbox GROUP BY status"
+            ):
+                counts[status] = count
+        return counts
+
+    def purge(self, status: str = SENT, older_than: float = 0) -> int:
+        """
+        Deletes the Orders in a final state
+        :param status: Outbox.SENT or Outbox.FAILED
+        :param older_than: Only those last updated at least this many seconds ago
+        :return: Number of Orders deleted
+        """
+        if status not in (SENT, FAILED):
+            raise exceptions.IncorrectParameterError(
+                "Only sent or failed Orders can be purged"
+            )
+        with self._lock, self._transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM outbox WHERE status = ? AND updated_at <= ?",
+                (status, self.clock() - older_than),
+            )
+            return cursor.rowcount
+
+    def start(self, shipments):
+        """
+        Starts the worker thread flushing through shipments, if not running yet
+        :param shipments: newgistics.fulfillments.Shipment of the client to post with
+        """
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopping.clear()
+            self._worker = threading.Thread(
+                target=self._run,
+                args=(shipments,),
+                name="newgistics-outbox",
+                daemon=True,
+            )
+            self._worker.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stops the worker thread once its current batch is recorded. Orders not sent yet
+        stay in the database and are picked up by the next flush.
+        :param timeout: Seconds to wait for the thread, forever if None
+        """
+        worker = self._worker
+        if worker is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        worker.join(timeout)
+        self._worker = None
+
+    def close(self):
+        """
+        Stops the worker thread and closes the database
+        """
+        self.stop()
+        with self._lock:
+            self._connection.close()
+
+    def _run(self, shipments):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush(shipments)
+            except Exception:
+                # Whatever failed stays claimed and is retried once its lease expires
+                logger.exception("Newgistics outbox flush failed")
+
+    def _select(self, where: str, values: tuple) -> list:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT {columns} FROM outbox {where} ORDER BY outbox_id".format(
+                    columns=", ".join(_COLUMNS), where=where
+                ),
+                values,
+            ).fetchall()
+        results = []
+        for row in rows:
+            result = dict(zip(_COLUMNS, row))
+            result["id"] = result.pop("order_id")
+            result["errors"] = json.loads(result["errors"] or "[]")
+            result["result"] = json.loads(result["result"] or "null")
+            results.append(result)
+        return results
+
+    def _transaction(self):
+        return _Transaction(self._connection)
+
+
+class _Transaction(object):
+    """
+    BEGIN IMMEDIATE ... COMMIT, so concurrent processes sharing the database take turns
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Cursor:
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("BEGIN IMMEDIATE")
+        return self.cursor
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.cursor.execute("COMMIT")
+        else:
+            self.cursor.execute("ROLLBACK")
+        self.cursor.close()
+
+
+def _dumps(value) -> str:
+    # str() matches how newgistics.serialize writes values JSON has no type for
+    return json.dumps(value, default=str, separators=(",", ":"))
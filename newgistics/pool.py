@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.pool
+~~~~~~~~~~~~~~~
+
+Thread pool helpers used to fan many blocking requests out over one shared Session.
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import exceptions
+
+# Default (connect, read) timeout in seconds of every blocking request
+DEFAULT_TIMEOUT = (10, 60)
+
+
+def make_session(
+    pool_connections: int = 10, pool_maxsize: int = 10, adapter=None
+) -> requests.Session:
+    """
+    Creates a keep-alive requests.Session with a sized connection pool
+    :param pool_connections: Number of hosts to keep a connection pool for
+    :param pool_maxsize: Number of connections kept open per host
+    :param adapter: requests adapter mounted instead of the pooled HTTPAdapter, e.g. a
+                    newgistics.transport.ReplayAdapter (Optional)
+    :return: requests.Session object
+    """
+
+    session = requests.Session()
+    for prefix in ("https://", "http://"):
+        session.mount(
+            prefix,
+            adapter
+            or HTTPAdapter(
+                pool_connections=pool_connections, pool_maxsize=pool_maxsize
+            ),
+        )
+    return session
+
+
+def ensure_pool_size(session: requests.Session, size: int, prefix: str = "https://"):
+    """
+    Makes sure the adapter mounted for prefix keeps at least size connections per host,
+    otherwise threads beyond the pool size would open and discard a connection per request.
+    Only for sessions made by make_session(): the HTTPAdapter is replaced and closed, so
+    the clients leave a session passed in by the caller, and its adapters, alone
+    :param session: requests.Session object
+    :param size: Number of connections that may be used concurrently
+    :param prefix: URL prefix of the adapter
+    """
+
+    adapter = session.get_adapter(prefix)
+    # A subclass (TLS settings, retries, a proxy) or a transport is the caller's
+    if type(adapter) is not HTTPAdapter or adapter._pool_maxsize >= size:
+        return
+    session.mount(
+        prefix,
+        HTTPAdapter(
+            pool_connections=adapter._pool_connections,
+            pool_maxsize=size,
+            max_retries=adapter.max_retries,
+            pool_block=adapter._pool_block,
+        ),
+    )
+    adapter.close()
+
+
+def _call(func, item):
+    try:
+        return {"params": item, "response": func(item), "error": None}
+    except (exceptions.NewgisticsException, requests.RequestException) as err:
+        return {"params": item, "response": None, "error": err}
+
+
+def map_calls(func, items, workers: int = 8, ordered: bool = True):
+    """
+    Calls func(item) for every item over a thread pool.
+    At most 2 * workers items are read ahead, so items may be a lazy iterable of any size.
+    :param func: Callable taking a single item
+    :param items: Iterable of items
+    :param workers: Number of threads
+    :param ordered: Yield results in the order of items if True, else as they complete
+    :return: Generator of dicts {'params': item, 'response': func's result or None,
+             'error': the exception raised by func or None}
+    """
+
+    if workers < 1:
+        raise exceptions.IncorrectParameterError("workers must be at least 1")
+
+    items = iter(items)
+    max_pending = 2 * workers
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.append(executor.submit(_call, func, item))
+            if not pending:
+                return
+            if ordered:
+                yield pending.popleft().result()
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield future.result()
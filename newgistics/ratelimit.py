@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.ratelimit
+~~~~~~~~~~~~~~~~~~~~
+
+Client-side token buckets keeping the requests made with an API key under Newgistics's limits.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from . import exceptions
+
+
+class MemoryBackend(object):
+    """
+    Keeps the buckets in this process, shared by all its threads
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key: str, rate: float, capacity: float) -> float:
+        """
+        Takes a token from the bucket key
+        :param key: Bucket name
+        :param rate: Tokens added per second
+        :param capacity: Maximum number of tokens held by the bucket
+        :return: 0 if a token was taken, else the seconds to wait before trying again
+        """
+        with self._lock:
+            state, wait = _take(
+                self._buckets.get(key), rate, capacity, time.monotonic()
+            )
+            self._buckets[key] = state
+            return wait
+
+
+class FileBackend(object):
+    """
+    Keeps the buckets in files under directory, locked with fcntl.flock, so every
+    process of the host using the same directory shares them. Unix only.
+    """
+
+    _format = struct.Struct("<dd")
+
+    def __init__(self, directory: str):
+        """
+        :param directory: Directory holding one small file per bucket, created if missing
+        """
+        if fcntl is None:
+            raise exceptions.IncorrectParameterError(
+                "FileBackend requires fcntl, which is not available on this platform"
+            )
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def take(self, key: str, rate: float, capacity: float) -> float:
+        """
+        Takes a token from the bucket key, see MemoryBackend.take
+        """
+        path = os.path.join(self.directory, key)
+        with open(path, "a+b") as bucket_file:
+            fcntl.flock(bucket_file, fcntl.LOCK_EX)
+            try:
+                bucket_file.seek(0)
+                data = bucket_file.read(self._format.size)
+                state = None
+                if len(data) == self._format.size:
+                    state = self._format.unpack(data)
+                state, wait = _take(state, rate, capacity, time.time())
+                bucket_file.seek(0)
+                bucket_file.truncate()
+                bucket_file.write(self._format.pack(*state))
+                bucket_file.flush()
+            finally:
+                fcntl.flock(bucket_file, fcntl.LOCK_UN)
+        return wait
+
+
+def _take(state, rate: float, capacity: float, now: float):
+    """
+    Refills a bucket for the time elapsed since its last update and takes a token out of it
+    :param state: (tokens, updated at) tuple, None for a new (full) bucket
+    :return: (new state, seconds to wait, 0 when a token was taken)
+    """
+    if state is None:
+        tokens = capacity
+    else:
+        tokens, updated = state
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0.0
+    return (tokens, now), (1 - tokens) / rate
+
+
+class RateLimiter(object):
+    """
+    Token bucket per API key and per endpoint.
+    Each bucket holds up to burst tokens, is refilled at rate tokens per second, and every
+    request (retries included) takes one token, waiting for it if the bucket is empty.
+
+    Usage::
+      >>> limiter = RateLimiter(rate=5, burst=10, limits={'post_shipments.aspx': (1, 2)},
+      ...                       backend=FileBackend('/tmp/newgistics-buckets'))
+      >>> ngf_client = NewgisticsFulfillment(api_key='API-KEY', rate_limiter=limiter)
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = None,
+        limits: dict = None,
+        backend=None,
+        sleep=time.sleep,
+    ):
+        """
+        :param rate: Requests per second allowed per API key and endpoint
+        :param burst: Requests that may be sent at once after an idle period, rate by default
+        :param limits: {endpoint: (rate, burst)} overriding the defaults for some endpoints
+                       Example: {'post_shipments.aspx': (1, 2)} (Optional)
+        :param backend: Where buckets are kept, MemoryBackend() by default. Pass a FileBackend
+                        to coordinate the processes of a host (Optional)
+        :param sleep: Function used to wait, time.sleep by default
+        """
+        if rate <= 0:
+            raise exceptions.IncorrectParameterError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst or rate)
+        self.limits = limits or {}
+        self.backend = backend or MemoryBackend()
+        self.sleep = sleep
+
+    def _bucket(self, api_key: str, endpoint: str):
+        """
+        :return: (bucket key, rate, burst) of the API key and endpoint
+        """
+        rate, burst = self.limits.get(endpoint, (self.rate, self.burst))
+        # The API key is hashed so it never ends up in a file name
+        digest = hashlib.sha256(
+            "{api_key}\n{endpoint}".format(api_key=api_key, endpoint=endpoint).encode()
+        ).hexdigest()
+        return digest[:32], rate, max(1, burst or rate)
+
+    def acquire(self, api_key: str, endpoint: str):
+        """
+        Blocks until a request may be sent
+        :param api_key: API Key the request is sent with
+        :param endpoint: The resource after the base URL. Example: shipments.aspx
+        """
+        key, rate, burst = self._bucket(api_key, endpoint)
+        wait = self.backend.take(key, rate, burst)
+        while wait > 0:
+            self.sleep(wait)
+            wait = self.backend.take(key, rate, burst)
+
+    async def acquire_async(self, api_key: str, endpoint: str):
+        """
+        Same as acquire, waiting with asyncio.sleep instead of blocking the event loop
+        """
+        key, rate, burst = self._bucket(api_key, endpoint)
+        wait = self.backend.take(key, rate, burst)
+        while wait > 0:
+            # Imported here, the blocking clients never need asyncio
+            import asyncio
+
+            await asyncio.sleep(wait)
+            wait = self.backend.take(key, rate, burst)
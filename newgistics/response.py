@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.response
+~~~~~~~~~~~~~~~~~~~
+
+This module contains the response object returned by all the resources.
+"""
+
+import time
+
+import requests
+
+
+class ParsedResponse(object):
+    """
+    Wraps a requests.Response whose body is XML.
+    The body is parsed into a dict on first access only and memoized; every other
+    attribute (status_code, headers, url, ...) is read from the wrapped response.
+    """
+
+    def __init__(self, response: requests.Response):
+        self.response = response
+        self._dict = None
+        self._parsed = False
+
+    @property
+    def raw(self) -> bytes:
+        """
+        :return: Response body as received from Newgistics (XML)
+        """
+        return self.response.content
+
+    @property
+    def dict(self):
+        """
+        :return: Response body parsed by xmltodict, None for an empty body
+        """
+        if not self._parsed:
+            event = getattr(self.response, "newgistics_event", None)
+            started = time.perf_counter()
+            self._dict = _parse(self.raw) if self.raw else None
+            self._parsed = True
+            if event is not None:
+                # Reported to the client's hooks, see newgistics.metrics
+                event.parsed(time.perf_counter() - started)
+        return self._dict
+
+    def json(self, **kwargs):
+        """
+        Kept for compatibility with requests.Response.json(), no JSON is involved
+        :return: Same object as .dict
+        """
+        return self.dict
+
+    def __getattr__(self, name):
+        if name == "response":
+            raise AttributeError(name)
+        return getattr(self.response, name)
+
+    def __bool__(self) -> bool:
+        return self.response.ok
+
+    def __repr__(self) -> str:
+        return "<ParsedResponse [{status_code}]>".format(
+            status_code=self.response.status_code
+        )
+
+
+def _parse(raw: bytes):
+    # xmltodict is only imported by the first response actually parsed
+    import xmltodict
+
+    return xmltodict.parse(raw)
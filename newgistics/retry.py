@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.retry
+~~~~~~~~~~~~~~~~
+
+Retry policy with exponential backoff and jitter shared by the Newgistics clients.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# Status codes worth another attempt, the rest are final
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# Methods that can be sent twice without side effects
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed attempt is retried and how long to wait before the next one.
+    Waits are drawn uniformly from [0, backoff_factor * 2 ** (attempt - 1)] ("full jitter") so
+    concurrent callers don't retry in lockstep, and a Retry-After header is honored.
+    Counters are kept for monitoring, see stats.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+        statuses=RETRY_STATUSES,
+        sleep=time.sleep,
+    ):
+        """
+        :param max_attempts: Attempts made per request, 1 disables retries
+        :param backoff_factor: Base of the exponential backoff in seconds
+        :param max_backoff: Upper bound of a single wait in seconds, Retry-After included
+        :param statuses: HTTP status codes that are retried
+        :param sleep: Function used to wait, time.sleep by default
+        """
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "exhausted": 0}
+
+    @property
+    def stats(self) -> dict:
+        """
+        :return: dict with the number of requests sent, retries made and requests that
+                 still failed after max_attempts attempts
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def count(self, name: str):
+        """
+        Increments one of the counters returned by stats
+        """
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def is_idempotent(method_name: str, idempotent: bool = None) -> bool:
+        """
+        :param method_name: HTTP Method Name. Example: GET POST
+        :param idempotent: Overrides the guess made from the method (Optional)
+        :return: True if the request may be sent again
+        """
+        if idempotent is not None:
+            return idempotent
+        return method_name.upper() in IDEMPOTENT_METHODS
+
+    def backoff(self, attempt: int, response=None) -> float:
+        """
+        :param attempt: Number of attempts made so far
+        :param response: Response of the failed attempt, if any (Optional)
+        :return: Seconds to wait before the next attempt
+        """
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        ceiling = min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def should_retry(self, attempt: int, response=None, error=None) -> bool:
+        """
+        :param attempt: Number of attempts made so far
+        :param response: Response of the attempt (Optional)
+        :param error: Exception raised by the attempt (Optional)
+        :return: True if another attempt should be made
+        """
+        if error is None and response.status_code not in self.statuses:
+            return False
+        if attempt >= self.max_attempts:
+            self.count("exhausted")
+            return False
+        self.count("retries")
+        return True
+
+    def send(self, send, method_name: str, idempotent: bool = None):
+        """
+        Calls send() until it succeeds, fails for good or runs out of attempts
+        :param send: Callable sending the request and returning a requests.Response
+        :param method_name: HTTP Method Name. Example: GET POST
+        :param idempotent: Overrides the guess made from the method (Optional)
+        :return: requests.Response object of the last attempt
+        """
+        self.count("requests")
+        if not self.is_idempotent(method_name, idempotent):
+            return send()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if not self.should_retry(attempt, error=err):
+                    raise
+                self.sleep(self.backoff(attempt))
+                continue
+            if not self.should_retry(attempt, response=response):
+                return response
+            response.close()
+            self.sleep(self.backoff(attempt, response))
+
+
+def _retry_after(response):
+    """
+    :return: Seconds asked for by the Retry-After header of response, None if absent
+    """
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
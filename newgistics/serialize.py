@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.serialize
+~~~~~~~~~~~~~~~~~~~~
+
+XML writer for the Fulfillments API payloads (Orders/Order, Returns/Return).
+Produces the same document as xmltodict.unparse, without going through a SAX handler.
+"""
+
+from xml.sax.saxutils import escape, quoteattr
+
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+
+
+def _to_text(value) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _is_sequence(value) -> bool:
+    return hasattr(value, "__iter__") and not isinstance(
+        value, (str, bytes, bytearray, memoryview, dict)
+    )
+
+
+def _emit(key: str, value, write):
+    """
+    Writes value as one (or, for a list, several) <key> element(s)
+    :param key: Tag name
+    :param value: dict, list, scalar or None, with xmltodict's @attribute and #text keys
+    :param write: Callable receiving the str pieces of the document
+    """
+
+    values = value if _is_sequence(value) else (value,)
+    for node in values:
+        if node is None:
+            write("<" + key + "></" + key + ">")
+            continue
+        if not isinstance(node, dict):
+            text = _to_text(node)
+            write("<" + key + ">" + escape(text) + "</" + key + ">")
+            continue
+
+        text = None
+        attributes = []
+        children = []
+        for child_key, child_value in node.items():
+            if child_key == "#text":
+                text = None if child_value is None else _to_text(child_value)
+            elif child_key.startswith("@"):
+                attributes.append(
+                    " {name}={value}".format(
+                        name=child_key[1:],
+                        value=quoteattr(
+                            "" if child_value is None else _to_text(child_value)
+                        ),
+                    )
+                )
+            elif not (isinstance(child_value, list) and not child_value):
+                # xmltodict leaves empty lists out
+                children.append((child_key, child_value))
+
+        write("<" + key + "".join(attributes) + ">")
+        for child_key, child_value in children:
+            _emit(child_key, child_value, write)
+        if text:
+            write(escape(text))
+        write("</" + key + ">")
+
+
+def unparse(payload: dict) -> str:
+    """
+    Drop-in replacement of xmltodict.unparse(payload) for the payloads of this package
+    :param payload: dict with a single root key
+    :return: XML document
+    """
+
+    if len(payload) != 1:
+        raise ValueError("Document must have exactly one root.")
+    parts = [XML_DECLARATION]
+    for key, value in payload.items():
+        _emit(key, value, parts.append)
+    return "".join(parts)
+
+
+def order_id(order: dict):
+    """
+    :param order: A single Order of a Shipment payload
+    :return: The order id, whether given as @id or id
+    """
+    return order.get("@id") or order.get("id")
+
+
+def _prepare_order(order: dict) -> dict:
+    if order.get("@id") or not order.get("id"):
+        return order
+    order = dict(order)
+    order["@id"] = order["id"]
+    return order
+
+
+def _prepare_return(inbound_return: dict) -> dict:
+    inbound_return = dict(inbound_return)
+    if not inbound_return.get("@id") and inbound_return.get("id"):
+        # Where shipment id exists
+        inbound_return["@id"] = inbound_return.pop("id")
+    elif not inbound_return.get("@orderID") and inbound_return.get("orderID"):
+        # Where order id exists
+        inbound_return["@orderID"] = inbound_return.pop("orderID")
+    return inbound_return
+
+
+def _map(value, func):
+    if isinstance(value, dict):
+        return func(value)
+    return [func(item) for item in value]
+
+
+def orders(payload: dict, api_key: str) -> str:
+    """
+    Serializes a Shipment payload, adding the API key and moving each order id into
+    the id attribute. The payload is left untouched.
+    :param payload: {'Orders': {'Order': order dict or list of order dicts}}
+    :param api_key: API Key for Newgistics Fulfillments API
+    :return: XML document
+    """
+
+    root = dict(payload["Orders"])
+    root["@apiKey"] = api_key
+    root["Order"] = _map(root["Order"], _prepare_order)
+    return unparse({"Orders": root})
+
+
+def returns(payload: dict, api_key: str) -> str:
+    """
+    Serializes an Inbound Return payload, adding the API key and moving the shipment id
+    (or else the order id) of each return into an attribute. The payload is left untouched.
+    :param payload: {'Returns': {'Return': return dict or list of return dicts}}
+    :param api_key: API Key for Newgistics Fulfillments API
+    :return: XML document
+    """
+
+    root = dict(payload["Returns"])
+    root["@apiKey"] = api_key
+    root["Return"] = _map(root["Return"], _prepare_return)
+    return unparse({"Returns": root})
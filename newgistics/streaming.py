@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.streaming
+~~~~~~~~~~~~~~~~~~~~
+
+Incremental XML helpers used to walk large Newgistics responses one record at a time.
+"""
+
+from collections import OrderedDict
+from xml.etree import ElementTree
+
+# Size of the chunks read off the socket when a response is streamed
+CHUNK_SIZE = 64 * 1024
+
+
+def element_to_dict(element: ElementTree.Element):
+    """
+    Converts an ElementTree element into the structure ``xmltodict.parse`` builds for it,
+    so streamed records look exactly like the ones found in a fully parsed response.
+    :param element: xml.etree.ElementTree.Element object
+    :return: OrderedDict, str or None
+    """
+
+    node = OrderedDict(("@" + key, value) for key, value in element.attrib.items())
+    text_parts = [element.text] if element.text else []
+    for child in element:
+        value = element_to_dict(child)
+        if child.tag in node:
+            if isinstance(node[child.tag], list):
+                node[child.tag].append(value)
+            else:
+                node[child.tag] = [node[child.tag], value]
+        else:
+            node[child.tag] = value
+        if child.tail:
+            text_parts.append(child.tail)
+
+    text = "".join(text_parts).strip() or None
+    if not node:
+        return text
+    if text is not None:
+        node["#text"] = text
+    return node
+
+
+def iter_elements(chunks, tag: str = None):
+    """
+    Incrementally parses an XML document and yields every direct child of the root element.
+    Each element is cleared once the consumer asks for the next one, so it must be used
+    (or copied) before advancing the generator.
+    :param chunks: Iterable of bytes, e.g. requests.Response.iter_content()
+    :param tag: Only yield children with this tag name (Optional)
+    :return: Generator of xml.etree.ElementTree.Element objects
+    """
+
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    root = None
+    depth = 0
+
+    def drain():
+        nonlocal root, depth
+        for event, element in parser.read_events():
+            if event == "start":
+                depth += 1
+                if root is None:
+                    root = element
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if tag is None or element.tag == tag:
+                yield element
+            element.clear()
+            root.remove(element)
+
+    for chunk in chunks:
+        if chunk:
+            parser.feed(chunk)
+            yield from drain()
+    parser.close()
+    yield from drain()
+
+
+def iter_records(chunks, tag: str = None):
+    """
+    Incrementally parses an XML document and yields its records as dicts
+    :param chunks: Iterable of bytes, e.g. requests.Response.iter_content()
+    :param tag: Record tag name, e.g. Shipment or Return (Optional)
+    :return: Generator of OrderedDict objects
+    """
+
+    for element in iter_elements(chunks, tag=tag):
+        yield element_to_dict(element)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.sync
+~~~~~~~~~~~~~~~
+
+Incremental sync of Shipments and Returns: every run fetches the time window since the
+previous one and yields only the records that are new or changed, according to a
+checkpoint (cursor and content hashes) persisted in a SQLite database.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from . import exceptions
+from .fulfillments import TIMESTAMP_FORMAT, _record_key
+
+# {resource: (start, end) request parameters of the timestamp window fetched by a run}
+WINDOW_PARAMS = {
+    "shipments": ("startShippedTimestamp", "endShippedTimestamp"),
+    "returns": ("startReceivedTimestamp", "endReceivedTimestamp"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_cursor (
+    name TEXT PRIMARY KEY,
+    position TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_record (
+    name TEXT NOT NULL,
+    record_key TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    seen_at TEXT NOT NULL,
+    PRIMARY KEY (name, record_key)
+);
+"""
+
+
+def record_digest(record) -> bytes:
+    """
+    :return: Hash of the content of a record parsed by xmltodict
+    """
+    content = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+
+class Sync(object):
+    """
+    Polls a resource of a NewgisticsFulfillment client for changes.
+
+    Each run of changes() streams the records of the window [cursor - overlap, now] and
+    yields those whose id was never seen or whose content hash differs from the one stored.
+    The cursor and hashes are saved once the generator is exhausted: a run that is
+    interrupted (exception, break) yields its records again on the next run.
+    The overlap covers records that reach Newgistics late or clocks that disagree; records
+    fetched twice because of it are not yielded twice.
+
+    Usage::
+      >>> sync = Sync(ngf_client, '/var/lib/myapp/newgistics-sync.sqlite3')
+      >>> for shipment in sync.changes('shipments', start=datetime(2019, 4, 1)):
+      ...     update_order_status(shipment)
+    """
+
+    def __init__(
+        self,
+        client,
+        path: str,
+        overlap: timedelta = timedelta(minutes=10),
+        window_params: dict = None,
+        clock=datetime.now,
+    ):
+        """
+        :param client: newgistics.NewgisticsFulfillment object
+        :param path: SQLite database file holding the checkpoints, created if missing
+        :param overlap: How far before the cursor each run starts
+        :param window_params: {resource: (start, end) parameter names}, overriding
+                              WINDOW_PARAMS, e.g. to sync on another timestamp (Optional)
+        :param clock: Function returning the current datetime, as Newgistics expects it
+        """
+        self.client = client
+        self.path = path
+        self.overlap = overlap
+        self.window_params = dict(WINDOW_PARAMS, **(window_params or {}))
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+
+    def changes(
+        self,
+        resource: str,
+        start: datetime = None,
+        params: dict = None,
+        name: str = None,
+    ):
+        """
+        Fetches the window since the last run and yields its new or changed records
+        :param resource: 'shipments' or 'returns', or another resource of window_params
+        :param start: Where the first run starts, when no cursor is saved yet
+        :param params: Other HTTP Request Parameters (Optional)
+        :param name: Name of the checkpoint, the resource by default. Use one per distinct
+                     params to sync several filtered views of a resource
+        :return: Generator of OrderedDict objects
+        """
+        if resource not in self.window_params:
+            raise exceptions.IncorrectParameterError(
+                "No window parameters for resource {resource}".format(resource=resource)
+            )
+        name = name or resource
+        cursor = self.cursor(name)
+        if cursor is None:
+            if start is None:
+                raise exceptions.RequiredParameterMissing(
+                    "start is required for the first run of {name}".format(name=name)
+                )
+            window_start = start
+        else:
+            window_start = cursor - self.overlap
+        window_end = self.clock()
+
+        start_param, end_param = self.window_params[resource]
+        params = dict(params or {})
+        params[start_param] = window_start.strftime(TIMESTAMP_FORMAT)
+        params[end_param] = window_end.strftime(TIMESTAMP_FORMAT)
+
+        seen_at = window_end.strftime(TIMESTAMP_FORMAT)
+        changed = {}
+        for record in getattr(self.client, resource).iter_fetch(params=params):
+            key = str(_record_key(record))
+            digest = record_digest(record)
+            if key in changed or digest == self._digest(name, key):
+                continue
+            changed[key] = digest
+            yield record
+
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO sync_record (name, record_key, digest, seen_at)"
+                " VALUES (?, ?, ?, ?)",
+                [(name, key, digest, seen_at) for key, digest in changed.items()],
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sync_cursor (name, position) VALUES (?, ?)",
+                (name, seen_at),
+            )
+
+    def cursor(self, name: str):
+        """
+        :param name: Name of the checkpoint
+        :return: End of the last completed run as a datetime, None before the first one
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT position FROM sync_cursor WHERE name = ?", (name,)
+            ).fetchone()
+        return datetime.strptime(row[0], TIMESTAMP_FORMAT) if row else None
+
+    def reset(self, name: str):
+        """
+        Forgets the cursor and hashes of a checkpoint, the next run starts over
+        :param name: Name of the checkpoint
+        """
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.execute("DELETE FROM sync_cursor WHERE name = ?", (name,))
+            self._connection.execute("DELETE FROM sync_record WHERE name = ?", (name,))
+
+    def prune(self, name: str, older_than: timedelta) -> int:
+        """
+        Drops the hashes of records not changed for a while, keeping the index small.
+        A pruned record is yielded again if it shows up in a later window.
+        :param name: Name of the checkpoint
+        :param older_than: Age of the last change of the records to drop
+        :return: Number of hashes dropped
+        """
+        before = (self.clock() - older_than).strftime(TIMESTAMP_FORMAT)
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            return self._connection.execute(
+                "DELETE FROM sync_record WHERE name = ? AND seen_at < ?", (name, before)
+            ).rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _digest(self, name: str, key: str):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT digest FROM sync_record WHERE name = ? AND record_key = ?",
+                (name, key),
+            ).fetchone()
+        return row[0] if row else None
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+"""
+newgistics.transport
+~~~~~~~~~~~~~~~~~~~~
+
+Record/replay transports: requests adapters that save the traffic of a client to a
+compact archive and serve it back later, without a network, with simulated latency and
+injected errors. Useful to load-test code built on the clients.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import exceptions
+
+# First bytes of an archive
+MAGIC = b"NGRR\x01"
+
+# Record header: status, elapsed microseconds, key, metadata and body sizes
+_HEADER = struct.Struct("<HIIII")
+
+# Headers describing the body as it was on the wire, not as it is stored
+_WIRE_HEADERS = frozenset(("content-encoding", "transfer-encoding", "content-length"))
+
+# Query parameters left out of request keys: the Fulfillments API key is not written to
+# archives, and traffic recorded with one key replays for another
+_CREDENTIAL_PARAMS = frozenset(("key",))
+
+# Latency replaying the elapsed time of each recorded response
+RECORDED = "recorded"
+
+
+def request_key(method: str, url: str, body=None) -> str:
+    """
+    Identity of a request in an archive: method, path and sorted query string without
+    the API key, whatever the host, and a hash of the body
+    """
+    parts = urlsplit(url)
+    query = urlencode(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if name.lower() not in _CREDENTIAL_PARAMS
+        )
+    )
+    digest = ""
+    if body:
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+    return "{method} {path}?{query}#{digest}".format(
+        method=method.upper(), path=parts.path.lower(), query=query, digest=digest
+    )
+
+
+def _route(key: str) -> str:
+    # Method and path of a request key
+    return key.split("?", 1)[0]
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Sends requests through adapter and appends every response received to the archive
+    at path. Response bodies are read in full before being returned, streamed or not.
+
+    Usage::
+      >>> recorder = RecordingAdapter('traffic.ngrr')
+      >>> ngf_client = NewgisticsFulfillment(api_key='API-KEY', staging=True, transport=recorder)
+    """
+
+    def __init__(self, path: str, adapter: BaseAdapter = None):
+        """
+        :param path: Archive file, appended to if it exists
+        :param adapter: Adapter actually sending the requests, a HTTPAdapter by default
+        """
+        super(RecordingAdapter, self).__init__()
+        self.path = path
+        self.adapter = adapter or HTTPAdapter()
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+
+    def send(self, request, **kwargs):
+        response = self.adapter.send(request, **kwargs)
+        body = response.content
+        meta = json.dumps(
+            {
+                "reason": response.reason,
+                "headers": [
+                    [name, value]
+                    for name, value in response.headers.items()
+                    if name.lower() not in _WIRE_HEADERS
+                ],
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+        key = request_key(request.method, request.url, request.body).encode("utf-8")
+        header = _HEADER.pack(
+            response.status_code,
+            min(int(response.elapsed.total_seconds() * 1e6), 0xFFFFFFFF),
+            len(key),
+            len(meta),
+            len(body),
+        )
+        with self._lock:
+            self._file.write(b"".join((header, key, meta, body)))
+            self._file.flush()
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests from an archive made by RecordingAdapter, without any network.
+    The archive is memory-mapped: only the index is read when opening it, bodies are
+    copied out of the page cache as they are served.
+
+    A request is answered with the responses recorded for the same method, path, query
+    and body, in turn. When there are none (a POST of other orders, a fetch of another
+    id), with the responses recorded for the same method and path, in turn, unless
+    strict. Without any, ReplayMissError is raised.
+
+    Usage::
+      >>> replay = ReplayAdapter('traffic.ngrr', latency=lognormal(0.120, 0.5),
+      ...                        errors={503: 0.01, requests.ReadTimeout: 0.001})
+      >>> ngf_client = NewgisticsFulfillment(api_key='API-KEY', transport=replay)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        latency=None,
+        errors: dict = None,
+        strict: bool = False,
+        seed=None,
+        sleep=time.sleep,
+    ):
+        """
+        :param path: Archive file
+        :param latency: Seconds each response is delayed by: a number, RECORDED for the
+                        recorded elapsed time, or a callable taking a random.Random, see
+                        uniform() and lognormal() (Optional)
+        :param errors: {HTTP status or requests exception class: probability} of the
+                       errors injected instead of a recorded response (Optional)
+                       Example: {503: 0.01, requests.ConnectTimeout: 0.001}
+        :param strict: Only answer requests recorded with the same query and body
+        :param seed: Seed of the latency and error draws, for reproducible runs (Optional)
+        :param sleep: Function used to wait, time.sleep by default
+        """
+        super(ReplayAdapter, self).__init__()
+        self.path = path
+        self.latency = latency
+        self.errors = dict(errors or {})
+        self.strict = strict
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._turns = {}
+        self._records = []
+        self._keys = {}
+        self._routes = {}
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = None
+        if size > len(MAGIC):
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index(size)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _index(self, size: int):
+        data = self._data
+        if data is not None and data[: len(MAGIC)] != MAGIC:
+            raise exceptions.InvalidFormat(
+                "{path} is not a recorded archive".format(path=self.path)
+            )
+        offset = len(MAGIC)
+        while data is not None and offset + _HEADER.size <= size:
+            status, elapsed, key_size, meta_size, body_size = _HEADER.unpack_from(
+                data, offset
+            )
+            start = offset + _HEADER.size
+            end = start + key_size + meta_size + body_size
+            if end > size:
+                # Torn last record, the recorder was interrupted
+                break
+            key = data[start : start + key_size].decode("utf-8")
+            meta = json.loads(data[start + key_size : start + key_size + meta_size])
+            body_offset = start + key_size + meta_size
+            index = len(self._records)
+            self._records.append(
+                (status, elapsed / 1e6, meta, body_offset, body_offset + body_size)
+            )
+            self._keys.setdefault(key, []).append(index)
+            self._routes.setdefault(_route(key), []).append(index)
+            offset = end
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+        candidates = self._keys.get(key)
+        turn_key = key
+        if candidates is None and not self.strict:
+            turn_key = _route(key)
+            candidates = self._routes.get(turn_key)
+        if candidates is None:
+            raise exceptions.ReplayMissError(
+                "No recorded response for {key}".format(key=key)
+            )
+
+        with self._lock:
+            turn = self._turns.get(turn_key, 0)
+            self._turns[turn_key] = turn + 1
+            draw = self._random.random()
+            latency = self.latency
+            if callable(latency):
+                latency = latency(self._random)
+        status, elapsed, meta, body_start, body_end = self._records[
+            candidates[turn % len(candidates)]
+        ]
+        if latency == RECORDED:
+            latency = elapsed
+        if latency:
+            self.sleep(latency)
+
+        injected = self._inject(draw)
+        if isinstance(injected, type):
+            raise injected(
+                "Injected {name}".format(name=injected.__name__), request=request
+            )
+        response = requests.Response()
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        if injected is not None:
+            response.status_code = injected
+            response.reason = "Injected"
+            response._content = b"<error>Injected error</error>"
+        else:
+            response.status_code = status
+            response.reason = meta["reason"]
+            response._content = self._data[body_start:body_end]
+        response.headers["Content-Length"] = str(len(response._content))
+        response._content_consumed = True
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=latency or 0)
+        response.connection = self
+        return response
+
+    def _inject(self, draw: float):
+        """
+        :return: Status code or exception class picked by draw, None for no error
+        """
+        for error, probability in self.errors.items():
+            if draw < probability:
+                return error
+            draw -= probability
+        return None
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        self._file.close()
+
+
+def uniform(low: float, high: float):
+    """
+    :return: Latency callable drawing uniformly between low and high seconds
+    """
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float = 0.5):
+    """
+    Log-normal latency, the usual shape of service response times: most responses near
+    the median and a long tail (p99 about median * e ** (2.33 * sigma))
+    :return: Latency callable
+    """
+    return lambda rng: median * rng.lognormvariate(0.0, sigma)
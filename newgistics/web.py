@@ -8,13 +8,14 @@ This module contains the resource wrapper for Newgistics Web REST API.
 """
 
 import os
-import json
+from contextlib import closing
 
 import requests
-import xmltodict
+from requests.compat import json as complexjson
 
-from .auth import WebAPIAuth
-from . import exceptions
+from .auth import RequestTemplate, WebAPIAuth
+from . import breaker, exceptions, labels, metrics, pool, ratelimit, retry, streaming
+from .response import ParsedResponse
 
 
 class NewgisticsREST(object):
@@ -23,12 +24,38 @@ class NewgisticsREST(object):
     """
 
     def __init__(
-        self, api_key: str = os.environ.get("NG_WEB_API_KEY"), staging: bool = False
+        self,
+        api_key: str = os.environ.get("NG_WEB_API_KEY"),
+        staging: bool = False,
+        session: requests.Session = None,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        timeout=pool.DEFAULT_TIMEOUT,
+        retry_policy: retry.RetryPolicy = None,
+        rate_limiter: ratelimit.RateLimiter = None,
+        hooks: list = None,
+        circuit_breaker: breaker.CircuitBreaker = None,
+        transport=None,
     ):
         """
         :param api_key: API Key for Newgistics Web REST API
                         (provided by your Newgistics's account manager).
         :param staging: False if in production else True
+        :param session: requests.Session to share a connection pool between clients, its
+                        adapters are used as they are: size their pools for the workers or
+                        concurrency used (Optional)
+        :param pool_connections: Number of hosts to pool connections for, ignored when a session is given
+        :param pool_maxsize: Connections kept alive per host, ignored when a session is given
+        :param timeout: Default timeout of a request in seconds, a float or a (connect, read) tuple
+        :param retry_policy: newgistics.retry.RetryPolicy, 3 attempts with backoff by default
+        :param rate_limiter: newgistics.ratelimit.RateLimiter, may be shared by clients (Optional)
+        :param hooks: Callables receiving a newgistics.metrics.RequestEvent per request,
+                      e.g. a newgistics.metrics.MetricsAggregator (Optional)
+        :param circuit_breaker: newgistics.breaker.CircuitBreaker failing requests fast while
+                                an endpoint fails, may be shared by clients (Optional)
+        :param transport: requests adapter sending the requests, e.g. a
+                          newgistics.transport.RecordingAdapter or ReplayAdapter,
+                          ignored when a session is given (Optional)
 
         Usage::
           >>> from newgistics import NewgisticsWeb
@@ -41,7 +68,16 @@ class NewgisticsREST(object):
         self.api_key = api_key
         self.staging_url = "https://apiint.newgistics.com"
         self.production_url = "https://api.newgistics.com"
-        self.session = requests.Session().request
+        self.timeout = timeout
+        self.retry_policy = retry_policy or retry.RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.hooks = list(hooks or [])
+        self.circuit_breaker = circuit_breaker
+        self.session = session or pool.make_session(
+            pool_connections, pool_maxsize, adapter=transport
+        )
+        self._owns_session = session is None
+        self._request_template = None
         self.labels = ShipmentLabel(self)
 
     @property
@@ -53,6 +89,39 @@ class NewgisticsREST(object):
             return self.staging_url
         return self.production_url
 
+    @property
+    def request_template(self) -> RequestTemplate:
+        """
+        :return: newgistics.auth.RequestTemplate of the current api_endpoint and api_key
+        """
+        key = (self.api_endpoint, self.api_key)
+        if self._request_template is None or self._request_template[0] != key:
+            template = WebAPIAuth(api_key=self.api_key).template(
+                self.api_endpoint, session=self.session
+            )
+            self._request_template = (key, template)
+        return self._request_template[1]
+
+    def close(self):
+        """
+        Closes the pooled connections, unless the session was passed in by the caller
+        """
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _dump_json(payload) -> bytes:
+    """
+    Encodes the payload the way requests does for its json= argument
+    """
+    return complexjson.dumps(payload, allow_nan=False).encode("utf-8")
+
 
 class BaseClient(object):
     """
@@ -70,49 +139,76 @@ class BaseClient(object):
         :param dict_payload: HTTP Request Payload (Optional)
         :param query_params: HTTP Request Query Params (Optional)
         :param headers: HTTP Request Headers (Optional)
+        :param timeout: Overrides the client's default timeout (Optional)
+        :param idempotent: Whether the request may be retried, guessed from the method by default (Optional)
+        :param stream: Leave the body on the socket, to be read with iter_content() (Optional)
         :return: requests.Response object
         """
 
         dict_payload = kwargs.get("dict_payload")
         query_params = kwargs.get("query_params")
         headers = kwargs.get("headers")
-        request_params = {
-            "url": "{api_endpoint}/{resource_endpoint}".format(
-                api_endpoint=self.client.api_endpoint,
-                resource_endpoint=resource_endpoint,
-            ),
-            "json": dict_payload,
-            "auth": WebAPIAuth(api_key=self.client.api_key),
-            "headers": headers or {},
-            "params": query_params or {},
+        timer = None
+        if self.client.hooks:
+            timer = metrics.RequestTimer(
+                method_name, resource_endpoint, self.client.hooks
+            )
+        json_payload = None
+        if dict_payload is not None:
+            if timer is not None:
+                json_payload = timer.serialize(_dump_json, dict_payload)
+            else:
+                json_payload = _dump_json(dict_payload)
+        template = self.client.request_template
+        prepared = template.prepare(
+            method_name,
+            resource_endpoint,
+            params=query_params,
+            data=json_payload,
+            headers=headers,
+        )
+        send_kwargs = {
+            "timeout": kwargs.get("timeout", self.client.timeout),
+            "stream": kwargs.get("stream", False),
         }
-        req = self.client.session(method_name, **request_params)
-        return req
 
-    @staticmethod
-    def process(response: requests.Response) -> requests.Response:
+        def send():
+            if self.client.rate_limiter is not None:
+                self.client.rate_limiter.acquire(self.client.api_key, resource_endpoint)
+            if self.client.circuit_breaker is not None:
+                return self.client.circuit_breaker.call(resource_endpoint, attempt)
+            return attempt()
 
-        # Convert XML response to JSON
-        parsed_dict = xmltodict.parse(response.content)
+        def attempt():
+            if timer is not None:
+                return timer.send(
+                    lambda: template.send(prepared, **send_kwargs),
+                    self.client.session,
+                    prepared.url,
+                )
+            return template.send(prepared, **send_kwargs)
 
-        # Override requests object with JSON response in-place of originally XML
-        response._content = str.encode(json.dumps(parsed_dict))
+        if timer is None:
+            return self.client.retry_policy.send(
+                send, method_name, idempotent=kwargs.get("idempotent")
+            )
         try:
-            response.raise_for_status()
-        except requests.HTTPError as http_err:
-            status_code = http_err.response.status_code
-            if status_code == 401:
-                raise exceptions.AccessNotGrantedError(http_err, response)
-            if status_code == 403:
-                raise exceptions.AuthenticationParameterError(http_err, response)
-            if status_code == 404:
-                raise exceptions.ResourceEntityNotFound(http_err, response)
-            if status_code == 422:
-                raise exceptions.AuthenticationParameterError(http_err, response)
-            if status_code == 500:
-                raise exceptions.InternalServerError(http_err, response)
-        except requests.RequestException as req_err:
-            raise exceptions.NewgisticsException(req_err, response)
+            req = self.client.retry_policy.send(
+                send, method_name, idempotent=kwargs.get("idempotent")
+            )
+        except Exception:
+            timer.done()
+            raise
+        timer.done(req)
+        return req
+
+    @staticmethod
+    def process(response: requests.Response) -> ParsedResponse:
+
+        # Only the status is checked, bodies are parsed when read (.dict, json_body)
+        response = ParsedResponse(response)
+        if response.status_code >= 400:
+            raise exceptions.from_response(response)
         return response
 
 
@@ -121,14 +217,15 @@ class ShipmentLabel(BaseClient):
     The resource class which communicates with the Shipments API.
     Functionalities under this class:
         Create Shipment
+        Create Shipments in bulk
     """
 
-    def create(self, payload: dict = None, params: dict = None) -> requests.Response:
+    def create(self, payload: dict = None, params: dict = None) -> ParsedResponse:
         """
         Creates Shipment Label
         :param params: HTTP Request Query Params (Optional)
         :param payload: HTTP Request Payload (Optional)
-        :return: requests.Response object
+        :return: newgistics.response.ParsedResponse object
 
         Usage::
           >>> ngweb_client.labels.create(payload={}, params={})
@@ -169,3 +266,138 @@ class ShipmentLabel(BaseClient):
             query_params=params,
         )
         return self.process(response)
+
+    def create_to(
+        self,
+        destination,
+        payload: dict = None,
+        params: dict = None,
+        label_tags=labels.LABEL_TAGS,
+    ) -> labels.LabelResult:
+        """
+        Creates Shipment Label(s) like create(), streaming the response and decoding the
+        base64 label data straight into destination instead of keeping the document
+        :param destination: Directory path (created before the request if missing),
+                            callable returning a writable per label, or a
+                            bytearray/memoryview/writable receiving every label, see
+                            newgistics.labels.write_labels
+        :param payload: HTTP Request Payload, as for create()
+        :param params: HTTP Request Query Params (Optional)
+        :param label_tags: Tags of the response elements holding label data
+        :return: newgistics.labels.LabelResult object, with a newgistics.labels.Label
+                 (index, path, offset, size, content_type) per label and the other
+                 response fields
+
+        Usage::
+          >>> result = ngweb_client.labels.create_to('/srv/labels/123456789A', payload={...})
+          >>> [label.path for label in result.labels]
+          ['/srv/labels/123456789A/label-0.pdf', '/srv/labels/123456789A/label-1.pdf']
+        """
+        # Before the label is created: failing to create the directory costs nothing yet
+        labels.prepare_destination(destination)
+        response = self._make_request(
+            "POST",
+            resource_endpoint="WebAPI/Shipment",
+            dict_payload=payload,
+            query_params=params,
+            stream=True,
+        )
+        with closing(response):
+            if not response.ok:
+                # Error bodies are small, downloaded before the stream is closed so the
+                # exception process() raises can still read them
+                response.content
+                self.process(response)
+            return labels.write_labels(
+                response.iter_content(chunk_size=streaming.CHUNK_SIZE),
+                destination,
+                status_code=response.status_code,
+                label_tags=label_tags,
+            )
+
+    def create_many(
+        self,
+        payloads,
+        concurrency: int = 8,
+        ordered: bool = True,
+        params: dict = None,
+        checkpoint: labels.Checkpoint = None,
+        key=None,
+        destination: str = None,
+    ):
+        """
+        Creates a Shipment Label per payload, concurrency requests at a time over the
+        client's connection pool. A failing payload is reported in its result and the
+        others go on, whatever the exception (HTTP error, unserializable payload, label
+        that can't be written).
+        :param payloads: Iterable of payloads as for create(), read lazily
+        :param concurrency: Number of requests in flight
+        :param ordered: Yield results in the order of payloads if True, else as they complete
+        :param params: HTTP Request Query Params of every request (Optional)
+        :param checkpoint: newgistics.labels.Checkpoint: payloads it holds are skipped and
+                           the ones created are added to it, so an interrupted run can be
+                           started again with the same payloads (Optional)
+        :param key: Callable returning the key identifying a payload in the checkpoint,
+                    e.g. lambda payload: payload['returnId']; its position by default
+        :param destination: Stream the labels of each payload to destination/<key>/ with
+                            create_to() instead of returning the documents (Optional)
+        :return: Generator of dicts {'index': position in payloads,
+                                     'key': key of the payload,
+                                     'payload': the payload,
+                                     'response': ParsedResponse (LabelResult with a
+                                                 destination), None if failed or skipped,
+                                     'error': the exception raised or None. With a
+                                              response, the label was created but could
+                                              not be recorded in the checkpoint, and a
+                                              run started again would create it again,
+                                     'skipped': True if already in the checkpoint}
+
+        Usage::
+          >>> with Checkpoint('recall.jsonl') as checkpoint:
+          ...     for result in ngweb_client.labels.create_many(payloads, concurrency=16,
+          ...                                                   checkpoint=checkpoint):
+          ...         if result['error'] is not None:
+          ...             print(result['key'], result['error'])
+        """
+
+        def items():
+            for index, payload in enumerate(payloads):
+                yield index, index if key is None else key(payload), payload
+
+        def create(item):
+            index, item_key, payload = item
+            if checkpoint is not None and item_key in checkpoint:
+                return None, None
+            try:
+                if destination is None:
+                    response = self.create(payload=payload, params=params)
+                else:
+                    directory = os.path.join(destination, str(item_key))
+                    response = self.create_to(directory, payload=payload, params=params)
+            except Exception as err:
+                # Not only HTTP errors: a payload that can't be serialized or a label
+                # that can't be written (disk full) fails this payload alone
+                return None, err
+            if checkpoint is not None:
+                try:
+                    checkpoint.record(item_key, status=response.status_code)
+                except Exception as err:
+                    # The label exists and was paid for: its response is kept
+                    return response, err
+            return response, None
+
+        if self.client._owns_session:
+            pool.ensure_pool_size(self.client.session, concurrency)
+        for result in pool.map_calls(
+            create, items(), workers=concurrency, ordered=ordered
+        ):
+            index, item_key, payload = result["params"]
+            response, error = result["response"]
+            yield {
+                "index": index,
+                "key": item_key,
+                "payload": payload,
+                "response": response,
+                "error": error,
+                "skipped": response is None and error is None,
+            }
@@ -26,7 +26,6 @@ setup(
         "License :: OSI Approved :: Apache Software License",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.5",
         "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: Implementation :: CPython",
@@ -36,13 +35,20 @@ setup(
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
     keywords="api wrapper client library newgistics rest web api fulfillments pitneybowes",
-    packages=find_packages(exclude=["contrib", "docs", "tests", "venv"]),
+    # hashlib.blake2b and os.PathLike
+    python_requires=">=3.6",
+    packages=find_packages(exclude=["benchmarks", "contrib", "docs", "tests", "venv"]),
     install_requires=["requests==2.22.0", "xmltodict==0.12.0"],
+    entry_points={"console_scripts": ["newgistics=newgistics.cli:main"]},
     test_suite="tests",
     test_require=["python-dotenv"],
     # List additional groups of dependencies here (e.g. development
     # dependencies). You can install these using the following syntax,
     # for example:
     # $ pip install -e .[dev]
-    extras_require={"dev": ["sphinx", "sphinx-autobuild"], "test": ["python-dotenv"]},
+    extras_require={
+        "dev": ["sphinx", "sphinx-autobuild"],
+        "test": ["python-dotenv"],
+        "async": ["aiohttp>=3.5"],
+    },
 )
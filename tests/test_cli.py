@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import threading
+import unittest
+
+import requests
+from requests.adapters import BaseAdapter
+
+from newgistics import NewgisticsFulfillment
+from newgistics.cli import import_orders
+
+
+class _BodiesAdapter(BaseAdapter):
+    """
+    Answers every request with 200 and the next of bodies
+    """
+
+    def __init__(self, bodies: list):
+        super(_BodiesAdapter, self).__init__()
+        self.bodies = list(bodies)
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self.lock:
+            body = self.bodies.pop(0)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = body
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class ImportOrdersTest(unittest.TestCase):
+    def test_non_xml_response_fails_its_batch_only(self):
+        adapter = _BodiesAdapter(
+            [
+                b'<response><success>true</success><Orders><Order id="1" success="true" />'
+                b'<Order id="2" success="true" /></Orders></response>',
+                b"<html>oops",
+            ]
+        )
+        orders = [(number, {"id": str(number)}) for number in range(1, 5)]
+        output = io.StringIO()
+        with NewgisticsFulfillment(api_key="TEST", transport=adapter) as client:
+            summary = import_orders(client, orders, output, batch_size=2, concurrency=1)
+
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        results = {line["id"]: line for line in lines if line["type"] == "order"}
+        self.assertEqual(sorted(results), ["1", "2", "3", "4"])
+        self.assertTrue(results["1"]["success"])
+        self.assertTrue(results["2"]["success"])
+        self.assertFalse(results["3"]["success"])
+        self.assertIn("Invalid response body", results["4"]["errors"][0])
+        self.assertEqual((summary["succeeded"], summary["failed"]), (2, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import requests
+import xmltodict
+
+from newgistics import NewgisticsFulfillment
+from newgistics.fulfillments import UNCONFIRMED, _order_results
+
+ORDER_IDS = ["4321", "4322"]
+
+
+def _response(body: bytes, status_code: int = 200) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    return response
+
+
+class OrderResultsTest(unittest.TestCase):
+    def test_per_order_nodes(self):
+        body = xmltodict.parse(
+            "<response><success>true</success><Orders>"
+            '<Order id="4321" success="true" />'
+            '<Order id="4322" success="false"><Errors><Error>Bad SKU</Error></Errors>'
+            "</Order></Orders></response>"
+        )
+
+        results = _order_results(body, ORDER_IDS)
+
+        self.assertEqual([result["id"] for result in results], ORDER_IDS)
+        self.assertTrue(results[0]["success"])
+        self.assertEqual(results[0]["errors"], [])
+        self.assertFalse(results[1]["success"])
+        self.assertEqual(results[1]["errors"], ["Bad SKU"])
+        self.assertEqual(results[1]["result"]["@id"], "4322")
+
+    def test_batch_level_error(self):
+        body = xmltodict.parse(
+            "<response><success>false</success>"
+            "<Errors><Error>Invalid document</Error></Errors></response>"
+        )
+
+        results = _order_results(body, ORDER_IDS)
+
+        for result in results:
+            self.assertFalse(result["success"])
+            self.assertEqual(result["errors"], ["Invalid document"])
+            self.assertIsNone(result["result"])
+
+    def test_empty_body_is_unconfirmed(self):
+        for body in (None, xmltodict.parse("<html><body>oops</body></html>")):
+            results = _order_results(body, ORDER_IDS)
+
+            for result in results:
+                self.assertFalse(result["success"])
+                self.assertEqual(result["errors"], [UNCONFIRMED])
+
+
+class BatchResultsTest(unittest.TestCase):
+    def setUp(self):
+        self.client = NewgisticsFulfillment(api_key="TEST")
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_non_xml_body_fails_the_batch(self):
+        results = self.client.shipments._batch_results(
+            _response(b"<html>oops"), ORDER_IDS
+        )
+
+        for result in results:
+            self.assertFalse(result["success"])
+            self.assertIn("Invalid response body", result["errors"][0])
+
+    def test_empty_body_is_unconfirmed(self):
+        results = self.client.shipments._batch_results(_response(b""), ORDER_IDS)
+
+        self.assertEqual([result["success"] for result in results], [False, False])
+        self.assertEqual(results[0]["errors"], [UNCONFIRMED])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+from requests.adapters import BaseAdapter
+
+from newgistics import NewgisticsFulfillment
+from newgistics.breaker import OPEN, CircuitBreaker
+from newgistics.outbox import FAILED, PENDING, SENDING, Outbox
+
+ORDER = {"id": "4321", "Items": {"Item": [{"SKU": "HLU", "Qty": 1}]}}
+
+
+class OutboxCircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.outbox = Outbox(os.path.join(self.directory, "outbox.sqlite3"))
+        self.breaker = CircuitBreaker(min_calls=1, window=1, open_duration=3600)
+        # Opens the circuit of the endpoint the outbox posts to
+        started = self.breaker.acquire("post_shipments.aspx")
+        self.breaker.release(
+            "post_shipments.aspx", started, error=ConnectionError("refused")
+        )
+        self.client = NewgisticsFulfillment(
+            api_key="TEST", outbox=self.outbox, circuit_breaker=self.breaker
+        )
+        # Nothing is listening, a request actually sent would fail differently
+        self.client.production_url = "http://127.0.0.1:1"
+
+    def tearDown(self):
+        self.client.close()
+        self.outbox.close()
+        shutil.rmtree(self.directory)
+
+    def test_open_circuit_puts_orders_back_without_an_attempt(self):
+        self.assertEqual(self.breaker.state("post_shipments.aspx"), OPEN)
+        outbox_ids = self.outbox.put([ORDER, dict(ORDER, id="4322")])
+
+        self.assertEqual(self.outbox.flush(self.client.shipments), 2)
+
+        for outbox_id in outbox_ids:
+            status = self.outbox.status(outbox_id)
+            self.assertEqual(status["status"], PENDING)
+            self.assertEqual(status["attempts"], 0)
+            self.assertIn("CircuitOpenError", status["errors"][0])
+        self.assertEqual(self.breaker.stats["rejected"], 1)
+        self.assertEqual(self.outbox.counts[SENDING], 0)
+
+
+class _HTMLAdapter(BaseAdapter):
+    """
+    Answers every request with 200 and a body that is not XML
+    """
+
+    def __init__(self):
+        super(_HTMLAdapter, self).__init__()
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"<html>oops"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class OutboxAttemptsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.now = 1000.0
+        self.outbox = Outbox(
+            os.path.join(self.directory, "outbox.sqlite3"),
+            max_attempts=3,
+            lease=10,
+            clock=lambda: self.now,
+        )
+        self.adapter = _HTMLAdapter()
+        self.client = NewgisticsFulfillment(
+            api_key="TEST", outbox=self.outbox, transport=self.adapter
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.outbox.close()
+        shutil.rmtree(self.directory)
+
+    def test_unreadable_response_is_recorded(self):
+        outbox_ids = self.outbox.put([ORDER, dict(ORDER, id="4322")])
+
+        for _ in range(6):
+            self.outbox.flush(self.client.shipments)
+            self.now += 60
+
+        self.assertEqual(self.adapter.sent, 1)
+        for outbox_id in outbox_ids:
+            status = self.outbox.status(outbox_id)
+            self.assertEqual(status["status"], FAILED)
+            self.assertEqual(status["attempts"], 1)
+            self.assertIn("Invalid response body", status["errors"][0])
+
+    def test_result_error_puts_orders_back(self):
+        outbox_id = self.outbox.put([ORDER])[0]
+
+        with mock.patch.object(
+            self.client.shipments, "_batch_results", side_effect=ValueError("bad")
+        ):
+            self.outbox.flush(self.client.shipments)
+
+        status = self.outbox.status(outbox_id)
+        self.assertEqual(status["status"], PENDING)
+        self.assertEqual(status["attempts"], 1)
+        self.assertEqual(status["errors"], ["ValueError: bad"])
+
+    def test_expired_lease_out_of_attempts_fails(self):
+        outbox_id = self.outbox.put([ORDER])[0]
+        # Claims left by flushes that died before recording an outcome
+        for _ in range(3):
+            self.assertEqual(len(self.outbox._claim(self.now)), 1)
+            self.now += 60
+
+        self.assertEqual(self.outbox.flush(self.client.shipments), 0)
+
+        status = self.outbox.status(outbox_id)
+        self.assertEqual(status["status"], FAILED)
+        self.assertEqual(status["attempts"], 3)
+        self.assertIn("Lease expired", status["errors"][0])
+        self.assertEqual(self.adapter.sent, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from newgistics import NewgisticsFulfillment
+from newgistics.pool import ensure_pool_size, make_session
+
+
+class _TLSAdapter(HTTPAdapter):
+    pass
+
+
+class EnsurePoolSizeTest(unittest.TestCase):
+    def test_grows_the_pool_of_a_session_the_client_made(self):
+        with NewgisticsFulfillment(api_key="TEST", pool_maxsize=4) as client:
+            client.map_fetch("shipments", [], workers=16)
+
+            adapter = client.session.get_adapter("https://")
+            self.assertIs(type(adapter), HTTPAdapter)
+            self.assertEqual(adapter._pool_maxsize, 16)
+
+    def test_leaves_a_session_passed_in_alone(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=4)
+        session.mount("https://", adapter)
+        with NewgisticsFulfillment(api_key="TEST", session=session) as client:
+            client.map_fetch("shipments", [], workers=16)
+
+        self.assertIs(session.get_adapter("https://"), adapter)
+        self.assertEqual(adapter._pool_maxsize, 4)
+        session.close()
+
+    def test_keeps_adapter_subclasses(self):
+        session = make_session(pool_maxsize=4)
+        adapter = _TLSAdapter(pool_maxsize=4)
+        session.mount("https://", adapter)
+
+        ensure_pool_size(session, 16)
+
+        self.assertIs(session.get_adapter("https://"), adapter)
+        session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+from requests.adapters import BaseAdapter
+
+from newgistics import NewgisticsWeb
+from newgistics.labels import Checkpoint
+
+LABEL = b"<ShipmentResponse><Success>true</Success></ShipmentResponse>"
+
+
+class _LabelAdapter(BaseAdapter):
+    """
+    Answers every request with a created label
+    """
+
+    def __init__(self):
+        super(_LabelAdapter, self).__init__()
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = LABEL
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class LabelsCreateManyTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = Checkpoint(os.path.join(self.directory, "labels.jsonl"))
+        self.adapter = _LabelAdapter()
+        self.client = NewgisticsWeb(api_key="TEST", transport=self.adapter)
+
+    def tearDown(self):
+        self.client.close()
+        self.checkpoint.close()
+        shutil.rmtree(self.directory)
+
+    def test_checkpoint_error_keeps_the_created_label(self):
+        payloads = [{"returnId": "R1"}, {"returnId": "R2"}]
+        # R2 gets a key JSON can't hold: created, not recorded
+        keys = {"R1": "R1", "R2": frozenset(["R2"])}
+
+        results = list(
+            self.client.labels.create_many(
+                payloads,
+                concurrency=1,
+                checkpoint=self.checkpoint,
+                key=lambda payload: keys[payload["returnId"]],
+            )
+        )
+
+        self.assertIsNone(results[0]["error"])
+        self.assertIn("R1", self.checkpoint)
+        self.assertEqual(self.adapter.sent, 2)
+        self.assertIsNotNone(results[1]["response"])
+        self.assertEqual(results[1]["response"].raw, LABEL)
+        self.assertIsInstance(results[1]["error"], TypeError)
+        self.assertFalse(results[1]["skipped"])
+
+
+if __name__ == "__main__":
+    unittest.main()